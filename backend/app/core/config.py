@@ -1,6 +1,7 @@
 from pydantic_settings import BaseSettings
-from typing import List, Union
+from typing import Tuple, Union
 from pydantic import field_validator
+from functools import cached_property, lru_cache
 import os
 
 
@@ -17,18 +18,24 @@ class Settings(BaseSettings):
     
     # Database settings - REQUIRED FROM ENVIRONMENT
     database_url: str
+    # Connection pool (per worker process), ignored for SQLite
+    db_pool_size: int = 25
+    db_max_overflow: int = 25
+    db_pool_recycle: int = 1800
+    # Compiled SQL cache entries per engine (SQLAlchemy default is 500)
+    db_query_cache_size: int = 1200
     
     # Redis settings - REQUIRED FROM ENVIRONMENT
     redis_url: str
     
     # CORS settings - REQUIRED FROM ENVIRONMENT
-    allowed_origins: Union[str, List[str]]
+    allowed_origins: Union[str, Tuple[str, ...]]
     
     @field_validator('allowed_origins')
     @classmethod
     def parse_allowed_origins(cls, v):
         if isinstance(v, str):
-            return [origin.strip() for origin in v.split(",")]
+            return tuple(origin for origin in map(str.strip, v.split(",")) if origin)
         return v
     
     # Code execution settings - ALL REQUIRED FROM ENVIRONMENT
@@ -37,7 +44,7 @@ class Settings(BaseSettings):
     max_code_size_kb: int
     
     # Supported languages - REQUIRED FROM ENVIRONMENT
-    supported_languages: Union[str, List[str]]
+    supported_languages: Union[str, Tuple[str, ...]]
     
     # Microservice Executor URLs - REQUIRED FROM ENVIRONMENT
     python_executor_url: str
@@ -61,6 +68,8 @@ class Settings(BaseSettings):
     register_rate_limit: int
     global_rate_limit: int
     auth_rate_limit: int
+    # "sliding_window" (default) or "token_bucket"
+    rate_limit_strategy: str = "sliding_window"
     
     # Email settings - ALL REQUIRED FROM ENVIRONMENT
     smtp_server: str
@@ -70,13 +79,13 @@ class Settings(BaseSettings):
     email_from: str
     
     # Admin settings - REQUIRED FROM ENVIRONMENT
-    admin_emails: Union[str, List[str]]
+    admin_emails: Union[str, Tuple[str, ...]]
     
     @field_validator('admin_emails')
     @classmethod
     def parse_admin_emails(cls, v):
         if isinstance(v, str):
-            return [email.strip() for email in v.split(",") if email.strip()]
+            return tuple(email for email in map(str.strip, v.split(",")) if email)
         return v
     
     # Security settings - ALL REQUIRED FROM ENVIRONMENT
@@ -85,7 +94,7 @@ class Settings(BaseSettings):
     require_email_verification: bool
     environment: str
     enforce_https: bool
-    trusted_hosts: Union[str, List[str]]
+    trusted_hosts: Union[str, Tuple[str, ...]]
     enable_security_headers: bool
     hsts_max_age: int
     
@@ -93,15 +102,20 @@ class Settings(BaseSettings):
     @classmethod
     def parse_trusted_hosts(cls, v):
         if isinstance(v, str):
-            return [host.strip() for host in v.split(",")]
+            return tuple(host for host in map(str.strip, v.split(",")) if host)
         return v
     
     @field_validator('supported_languages')
     @classmethod
     def parse_supported_languages(cls, v):
         if isinstance(v, str):
-            return [lang.strip() for lang in v.split(",")]
+            return tuple(lang for lang in map(str.strip, v.split(",")) if lang)
         return v
+    
+    @cached_property
+    def supported_language_set(self) -> frozenset:
+        """supported_languages as a set, built once per Settings instance for per-request membership checks"""
+        return frozenset(self.supported_languages)
 
     class Config:
         env_file = ".env"
@@ -109,11 +123,7 @@ class Settings(BaseSettings):
         extra = "ignore"
 
 
-# Initialize settings - will fail if required environment variables are missing
-try:
-    settings = Settings()
-except Exception as e:
-    print(f"ERROR: Failed to load configuration from environment variables: {e}")
-    print("Please ensure all required environment variables are set in your .env file")
-    print("See env.development.example or env.production.example for reference")
-    raise
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build Settings once on first use - raises if required environment variables are missing"""
+    return Settings()
@@ -1,14 +1,28 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import create_engine, MetaData, JSON, DDL, event
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import settings
+from app.core.config import get_settings
+
+settings = get_settings()
+
+# Pool sizing only applies to server databases; SQLite uses its own pool classes
+pool_options = {} if settings.database_url.startswith("sqlite") else {
+    "pool_size": settings.db_pool_size,
+    "max_overflow": settings.db_max_overflow,
+    "pool_recycle": settings.db_pool_recycle,
+    # Reuse the most recently returned connection so a small set stays warm at low load
+    "pool_use_lifo": True,
+}
 
 # Create SQLAlchemy engine
 engine = create_engine(
     settings.database_url,
     pool_pre_ping=True,
-    pool_recycle=3600,
-    echo=settings.debug
+    echo=settings.debug,
+    # Room for every distinct statement the app issues, so none is recompiled per request
+    query_cache_size=settings.db_query_cache_size,
+    **pool_options
 )
 
 # Create SessionLocal class
@@ -17,9 +31,47 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 # Create Base class for models
 Base = declarative_base()
 
-# Dependency to get database session
+# updated_at is maintained by the database: a BEFORE UPDATE trigger on PostgreSQL
+# (plain plpgsql, no moddatetime extension needed) and an AFTER UPDATE trigger on SQLite.
+# Columns declare server_onupdate=FetchedValue() so the ORM knows to reload them.
+event.listen(
+    Base.metadata,
+    "before_create",
+    DDL(
+        "CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$ "
+        "BEGIN NEW.updated_at = now(); RETURN NEW; END; $$ LANGUAGE plpgsql"
+    ).execute_if(dialect="postgresql")
+)
+
+
+def add_updated_at_trigger(table):
+    """
+    Install the updated_at trigger on table. Runs on every create_all, after all
+    tables exist, so databases created before the trigger was added get it too.
+    """
+    name = table.name
+    event.listen(Base.metadata, "after_create", DDL(
+        f"DROP TRIGGER IF EXISTS {name}_set_updated_at ON {name}"
+    ).execute_if(dialect="postgresql"))
+    event.listen(Base.metadata, "after_create", DDL(
+        f"CREATE TRIGGER {name}_set_updated_at BEFORE UPDATE ON {name} "
+        "FOR EACH ROW EXECUTE FUNCTION set_updated_at()"
+    ).execute_if(dialect="postgresql"))
+    event.listen(Base.metadata, "after_create", DDL(
+        f"CREATE TRIGGER IF NOT EXISTS {name}_set_updated_at AFTER UPDATE ON {name} "
+        "FOR EACH ROW WHEN NEW.updated_at IS OLD.updated_at BEGIN "
+        f"UPDATE {name} SET updated_at = CURRENT_TIMESTAMP WHERE id = NEW.id; END"
+    ).execute_if(dialect="sqlite"))
+
+
+# JSON column type: JSONB on PostgreSQL (binary, indexable), plain JSON elsewhere (SQLite in development)
+JSONBVariant = JSON().with_variant(JSONB(), "postgresql")
+
+# Dependency to get database session. Request sessions keep loaded objects
+# usable after commit instead of re-SELECTing them when the response is built;
+# long-lived sessions (background processing) keep the default expiry
 def get_db():
-    db = SessionLocal()
+    db = SessionLocal(expire_on_commit=False)
     try:
         yield db
     finally:
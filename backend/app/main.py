@@ -1,14 +1,24 @@
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
 import uvicorn
+import asyncio
+import hashlib
+import importlib
+import math
 import time
-from collections import defaultdict
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 
 import os
+import sys
+from typing import Optional, Tuple
 try:
-    from app.core.config import settings
+    from app.core.config import get_settings
+    settings = get_settings()
 except Exception as e:
     print(f"Warning: Could not load full config: {e}")
     # Create minimal settings for Railway deployment
@@ -20,44 +30,109 @@ except Exception as e:
         host = "0.0.0.0"
         port = int(os.getenv("PORT", "8000"))
         enforce_https = False
-        allowed_origins = ["*"]  # Permissive for initial deployment
+        allowed_origins = ("*",)  # Permissive for initial deployment
         
         # Rate limiting settings
         global_rate_limit = 100
         auth_rate_limit = 10
         login_rate_limit = 5
         register_rate_limit = 3
+        rate_limit_strategy = os.getenv("RATE_LIMIT_STRATEGY", "sliding_window")
+        redis_url = os.getenv("REDIS_URL")
         
         # Security settings
         enable_security_headers = True
         hsts_max_age = 31536000
-        trusted_hosts = ["*"]
+        trusted_hosts = ("*",)
         
         # Supported languages
-        supported_languages = ["python", "javascript", "java", "cpp", "go", "rust"]
+        supported_languages = ("python", "javascript", "java", "cpp", "go", "rust")
     settings = MinimalSettings()
+
+# Both settings objects must provide everything main.py reads directly
+_missing = [
+    attr for attr in (
+        "app_name", "app_version", "debug", "environment", "host", "port", "enforce_https",
+        "allowed_origins", "trusted_hosts", "redis_url", "global_rate_limit", "auth_rate_limit",
+        "rate_limit_strategy", "enable_security_headers", "hsts_max_age",
+    )
+    if not hasattr(settings, attr)
+]
+if _missing:
+    raise RuntimeError(f"{type(settings).__name__} is missing required settings: {', '.join(_missing)}")
+
 # Import health router immediately (lightweight)
 from app.routers import health
+from app.services.rate_limiter import redis_rate_limiter
+from app.services.cache import response_cache
 
 # Lazy import heavy dependencies
 engine = None
 
+
+# Create database tables - Graceful failure for Railway
+def _init_db():
+    # Blocking DDL, run in a worker thread so router imports can proceed meanwhile
+    global engine
+    try:
+        from app.database.base import Base, engine
+        # Importing the models registers their tables on the shared Base.metadata
+        from app.models import user, code_submission, collaboration as collaboration_models, assignment, template
+        from sqlalchemy.orm import configure_mappers
+        
+        # Resolve relationships now rather than on the first query of the first request
+        configure_mappers()
+        Base.metadata.create_all(bind=engine)
+        print("✅ Database tables created successfully")
+    except Exception as e:
+        print(f"⚠️  Database connection failed: {e}")
+        print("💡 Continuing without database features for health check")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print("🚀 Starting application...")
+    app.state.rate_limit_cleanup_task = asyncio.create_task(_periodic_rate_limit_cleanup())
+    redis_url = settings.redis_url
+    if redis_url and not USE_TOKEN_BUCKET and await redis_rate_limiter.connect(redis_url):
+        app.state.redis = redis_rate_limiter.client
+        print("✅ Redis rate limiter connected")
+    if redis_url and await response_cache.connect(redis_url):
+        print("✅ Redis response cache connected")
+    
+    # Database setup and router loading are independent, run them together
+    await asyncio.gather(asyncio.to_thread(_init_db), load_routers())
+    
+    # The admin language rollup is a materialized view only on PostgreSQL
+    app.state.language_stats_task = None
+    if engine is not None and engine.dialect.name == "postgresql":
+        app.state.language_stats_task = asyncio.create_task(_periodic_language_stats_refresh())
+    
+    yield
+    
+    app.state.rate_limit_cleanup_task.cancel()
+    if app.state.language_stats_task is not None:
+        app.state.language_stats_task.cancel()
+    await redis_rate_limiter.close()
+    await response_cache.close()
+
 # Create FastAPI instance
 app = FastAPI(
     title=settings.app_name,
     version=settings.app_version,
     description="A secure online IDE platform with multi-language support and 2025 security standards",
-    debug=settings.debug
+    debug=settings.debug,
+    lifespan=lifespan
 )
 
 # WebSocket service is now separate - no more Socket.IO integration needed
 
 # Security Middlewares - Simplified for Railway deployment
 try:
-    if hasattr(settings, 'trusted_hosts') and (settings.environment == "production" or settings.enforce_https):
+    if settings.environment == "production" or settings.enforce_https:
         # Only allow trusted hosts in production
         # Add Railway health check domain to allowed hosts
-        railway_hosts = list(settings.trusted_hosts) + ["healthcheck.railway.app"]
+        railway_hosts = (*settings.trusted_hosts, "healthcheck.railway.app")
         app.add_middleware(
             TrustedHostMiddleware, 
             allowed_hosts=railway_hosts
@@ -65,110 +140,377 @@ try:
 except Exception as e:
     print(f"Warning: Skipping TrustedHostMiddleware: {e}")
 
-# Rate limiting storage
-rate_limit_storage = defaultdict(list)
-auth_rate_limit_storage = defaultdict(list)
+# Rate limiting window in seconds
+RATE_LIMIT_WINDOW = 60
 
-# Security middleware
-@app.middleware("http")
-async def security_middleware(request: Request, call_next):
-    # Skip security middleware for health check and API health
-    if request.url.path in ["/health", "/api/health"]:
-        return await call_next(request)
+# Upper bound on tracked clients per rate limit store
+RATE_LIMIT_MAX_CLIENTS = 100_000
+
+# Client identifiers longer than this are stored as a fixed-size digest
+MAX_KEY_LEN = 128
+
+# Limits are read once at startup rather than off the settings object per request
+GLOBAL_RATE_LIMIT = settings.global_rate_limit
+AUTH_RATE_LIMIT = settings.auth_rate_limit
+
+# Token bucket rate limiting (enabled with RATE_LIMIT_STRATEGY=token_bucket)
+USE_TOKEN_BUCKET = settings.rate_limit_strategy == "token_bucket"
+
+
+class TokenBucket:
+    """Per-client token bucket that refills `capacity` tokens per rate-limit window"""
+    __slots__ = ('tokens', 'ts')
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.ts = now
+
+    def consume(self, capacity: float, now: float) -> bool:
+        """Refill based on elapsed time and take one token, returns False if empty"""
+        elapsed = now - self.ts
+        self.tokens = min(capacity, self.tokens + elapsed * (capacity / RATE_LIMIT_WINDOW))
+        self.ts = now
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def retry_after(self, capacity: float) -> float:
+        """Seconds until the next token is available"""
+        return (1 - self.tokens) * RATE_LIMIT_WINDOW / capacity
+
+
+class RateLimitStore(OrderedDict):
+    """Per-client rate limit entries, evicting the least recently used client beyond maxsize"""
+
+    def __init__(self, maxsize: int = RATE_LIMIT_MAX_CLIENTS):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+    def prune(self, now: float) -> int:
+        """Drop clients with no activity inside the current window"""
+        expired = [
+            key for key, entry in self.items()
+            if now - _last_seen(entry) >= RATE_LIMIT_WINDOW
+        ]
+        for key in expired:
+            del self[key]
+        return len(expired)
+
+
+def _rate_limit_key(client_ip: str):
+    """Cap per-entry key size so oversized forwarded chains can't bloat the stores"""
+    if len(client_ip) <= MAX_KEY_LEN:
+        return client_ip
+    return hashlib.sha256(client_ip.encode()).digest()[:16]
+
+
+def _last_seen(entry) -> float:
+    if isinstance(entry, TokenBucket):
+        return entry.ts
+    return entry[-1] if entry else 0.0
+
+
+def _consume_token(storage: RateLimitStore, key, capacity: int, now: float) -> float:
+    """Take a token for key, returns 0.0 on success or the seconds to wait"""
+    bucket = storage.get(key)
+    if bucket is None:
+        bucket = storage[key] = TokenBucket(capacity, now)
+    if bucket.consume(capacity, now):
+        return 0.0
+    return bucket.retry_after(capacity)
+
+
+# Rate limiting storage (TokenBucket or deque of request timestamps per client)
+rate_limit_storage = RateLimitStore()
+auth_rate_limit_storage = RateLimitStore()
+
+# Clients already over their limit, mapped to the time they may retry
+blocked_until: dict = {}
+auth_blocked_until: dict = {}
+
+
+def _prune_blocked(blocked: dict, now: float):
+    for key in [key for key, until in blocked.items() if until <= now]:
+        del blocked[key]
+
+
+LANGUAGE_STATS_REFRESH_SECONDS = 60
+
+
+def _refresh_language_stats():
+    from app.database.base import SessionLocal
+    from app.models.code_submission import refresh_language_stats
+    
+    db = SessionLocal()
+    try:
+        refresh_language_stats(db)
+    finally:
+        db.close()
+
+
+async def _periodic_language_stats_refresh():
+    """Refresh the admin language rollup view once a minute"""
+    while True:
+        await asyncio.sleep(LANGUAGE_STATS_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(_refresh_language_stats)
+        except Exception as e:
+            print(f"⚠️  Language stats refresh failed: {e}")
+
+
+async def _periodic_rate_limit_cleanup():
+    """Evict idle clients from the rate limit stores once per window"""
+    while True:
+        await asyncio.sleep(RATE_LIMIT_WINDOW)
+        now = time.monotonic()
+        rate_limit_storage.prune(now)
+        auth_rate_limit_storage.prune(now)
+        _prune_blocked(blocked_until, now)
+        _prune_blocked(auth_blocked_until, now)
+
+GLOBAL_LIMIT_DETAIL = "Rate limit exceeded. Please try again later."
+AUTH_LIMIT_DETAIL = "Authentication rate limit exceeded. Please try again later."
+
+
+RateLimitResult = Optional[Tuple[str, float]]  # (429 detail, retry after seconds)
+
+
+def _check_token_bucket(rate_limit_key, is_auth_path: bool, current_time: float) -> RateLimitResult:
+    retry_after = _consume_token(rate_limit_storage, rate_limit_key, GLOBAL_RATE_LIMIT, current_time)
+    if retry_after:
+        return GLOBAL_LIMIT_DETAIL, retry_after
+    
+    if is_auth_path:
+        retry_after = _consume_token(auth_rate_limit_storage, rate_limit_key, AUTH_RATE_LIMIT, current_time)
+        if retry_after:
+            return AUTH_LIMIT_DETAIL, retry_after
+    return None
+
+
+def _window_retry_after(requests: deque, current_time: float) -> float:
+    return requests[0] + RATE_LIMIT_WINDOW - current_time if requests else RATE_LIMIT_WINDOW
+
+
+def _recent_requests(storage: RateLimitStore, rate_limit_key, current_time: float) -> deque:
+    """Return the client's timestamps with those older than the window dropped in place"""
+    requests = storage.get(rate_limit_key)
+    if requests is None:
+        requests = storage[rate_limit_key] = deque()
+    cutoff = current_time - RATE_LIMIT_WINDOW
+    while requests and requests[0] <= cutoff:
+        requests.popleft()
+    return requests
+
+
+def _check_sliding_window(rate_limit_key, is_auth_path: bool, current_time: float) -> RateLimitResult:
+    recent_requests = _recent_requests(rate_limit_storage, rate_limit_key, current_time)
+    
+    # Check global rate limit
+    if len(recent_requests) >= GLOBAL_RATE_LIMIT:
+        return GLOBAL_LIMIT_DETAIL, _window_retry_after(recent_requests, current_time)
+    
+    # Check auth endpoint rate limiting
+    if is_auth_path:
+        recent_auth_requests = _recent_requests(auth_rate_limit_storage, rate_limit_key, current_time)
         
-    # Handle cases where request.client might be None (e.g., in some deployment scenarios)
-    client_ip = getattr(request.client, 'host', '127.0.0.1') if request.client else '127.0.0.1'
-    current_time = time.time()
+        if len(recent_auth_requests) >= AUTH_RATE_LIMIT:
+            return AUTH_LIMIT_DETAIL, _window_retry_after(recent_auth_requests, current_time)
+        
+        # Only auth requests count against the auth limit
+        recent_auth_requests.append(current_time)
     
-    # Skip rate limiting for internal service calls from WebSocket service
-    user_agent = request.headers.get('user-agent', '')
-    is_internal_service = (
-        client_ip in ['127.0.0.1', 'localhost'] and 
-        ('axios' in user_agent.lower() or 'node.js' in user_agent.lower())
-    )
+    # Add current request to global rate limit (only for external requests)
+    recent_requests.append(current_time)
+    return None
+
+
+async def _apply_rate_limit(rate_limit_key, is_auth_path: bool, current_time: float) -> RateLimitResult:
+    if USE_TOKEN_BUCKET:
+        return _check_token_bucket(rate_limit_key, is_auth_path, current_time)
     
-    # Skip rate limiting for collaboration endpoints called by WebSocket service
-    is_collaboration_internal = request.url.path.startswith((
-        '/api/collaboration/sessions/',
-        '/api/collaboration/participants/'
-    )) and client_ip in ['127.0.0.1', 'localhost']
+    # Shared sliding window in Redis; per-worker in-memory window if Redis is down
+    retry_after = await redis_rate_limiter.hit(rate_limit_key, GLOBAL_RATE_LIMIT)
+    if retry_after is None:
+        return _check_sliding_window(rate_limit_key, is_auth_path, current_time)
+    if retry_after:
+        return GLOBAL_LIMIT_DETAIL, retry_after
+    if is_auth_path:
+        retry_after = await redis_rate_limiter.hit(rate_limit_key, AUTH_RATE_LIMIT, scope="auth")
+        if retry_after:
+            return AUTH_LIMIT_DETAIL, retry_after
+    return None
+
+
+async def _check_rate_limit(rate_limit_key, is_auth_path: bool, current_time: float) -> RateLimitResult:
+    """Return (detail, retry_after) if the client is over its limit, None otherwise"""
+    # Clients already rejected in this window skip the limiter entirely
+    until = blocked_until.get(rate_limit_key)
+    if until and until > current_time:
+        return GLOBAL_LIMIT_DETAIL, until - current_time
+    if is_auth_path:
+        until = auth_blocked_until.get(rate_limit_key)
+        if until and until > current_time:
+            return AUTH_LIMIT_DETAIL, until - current_time
     
-    # Apply rate limiting only for external requests
-    if not is_internal_service and not is_collaboration_internal:
-        # Clean old requests (older than 1 minute)
-        rate_limit_storage[client_ip] = [
-            req_time for req_time in rate_limit_storage[client_ip]
-            if current_time - req_time < 60
-        ]
+    limited = await _apply_rate_limit(rate_limit_key, is_auth_path, current_time)
+    if limited:
+        detail, retry_after = limited
+        blocked = auth_blocked_until if detail is AUTH_LIMIT_DETAIL else blocked_until
+        blocked[rate_limit_key] = current_time + retry_after
+    return limited
+
+
+# Paths that bypass the security middleware entirely
+SKIP_PATHS = frozenset({"/health", "/api/health"})
+
+# CORS preflights are answered by CORSMiddleware; HEAD carries no body to protect
+SKIP_METHODS = frozenset({"OPTIONS", "HEAD"})
+
+# Collaboration endpoints the WebSocket service calls from localhost
+INTERNAL_PREFIXES = (
+    '/api/collaboration/sessions/',
+    '/api/collaboration/participants/'
+)
+
+LOCAL_HOSTS = frozenset({'127.0.0.1', 'localhost'})
+
+# Body size limits for upload endpoints, enforced before the body is read:
+# the 100MB ZIP cap in the assignments router plus room for the other form fields
+UPLOAD_BODY_LIMITS = {
+    ("POST", "/api/assignments"): 101 * 1024 * 1024,
+}
+UPLOAD_TOO_LARGE_DETAIL = "File size too large. Maximum 100MB allowed."
+
+
+def _limit_body(receive, limit: int):
+    """Wrap receive so a body sent without Content-Length is cut off once it exceeds limit"""
+    received = 0
+    
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                # Raised inside the app's body parsing, so it becomes a normal 413 response
+                raise HTTPException(status_code=413, detail=UPLOAD_TOO_LARGE_DETAIL)
+        return message
+    
+    return limited_receive
+
+AUTH_PREFIX = "/api/auth/"
+
+# Security headers never change after startup, build them once
+_STATIC_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "X-Frame-Options": "DENY",
+    "X-XSS-Protection": "1; mode=block",
+    "Referrer-Policy": "strict-origin-when-cross-origin",
+    "Permissions-Policy": "camera=(), microphone=(), geolocation=()",
+    "Content-Security-Policy": "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'",
+}
+_HSTS_VALUE = f"max-age={settings.hsts_max_age}; includeSubDomains; preload"
+_HTTPS_MODE = settings.environment == "production" or settings.enforce_https
+_SECURITY_HEADERS_ENABLED = settings.enable_security_headers
+
+# Same headers as raw ASGI (name, value) pairs, appended to every response
+_STATIC_HEADER_TUPLES = [
+    (name.lower().encode("latin-1"), value.encode("latin-1"))
+    for name, value in _STATIC_HEADERS.items()
+]
+if _HTTPS_MODE:
+    _STATIC_HEADER_TUPLES.append((b"strict-transport-security", _HSTS_VALUE.encode("latin-1")))
+
+
+class SecurityMiddleware:
+    """Rate limiting and security headers as a pure ASGI middleware"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Skip security middleware for websockets, preflight/HEAD requests, health check and API health
+        if scope["type"] != "http" or scope["method"] in SKIP_METHODS or scope["path"] in SKIP_PATHS:
+            return await self.app(scope, receive, send)
+
+        path = scope["path"]
         
-        # Check global rate limit
-        if len(rate_limit_storage[client_ip]) >= settings.global_rate_limit:
-            raise HTTPException(status_code=429, detail="Rate limit exceeded. Please try again later.")
+        # Handle cases where the client might be None (e.g., in some deployment scenarios)
+        client = scope.get("client")
+        client_ip = client[0] if client else '127.0.0.1'
+        current_time = time.monotonic()  # In-process limiter state only; Redis keeps wall-clock scores
         
-        # Check auth endpoint rate limiting
-        if request.url.path.startswith("/api/auth/"):
-            auth_rate_limit_storage[client_ip] = [
-                req_time for req_time in auth_rate_limit_storage[client_ip]
-                if current_time - req_time < 60
-            ]
-            
-            if len(auth_rate_limit_storage[client_ip]) >= settings.auth_rate_limit:
-                raise HTTPException(
-                    status_code=429, 
-                    detail="Authentication rate limit exceeded. Please try again later."
-                )
+        # Skip rate limiting for internal service calls from WebSocket service
+        headers = Headers(scope=scope)
+        user_agent = headers.get('user-agent', '').lower()
+        is_internal_service = (
+            client_ip in LOCAL_HOSTS and 
+            ('axios' in user_agent or 'node.js' in user_agent)
+        )
         
-        auth_rate_limit_storage[client_ip].append(current_time)
+        # Skip rate limiting for collaboration endpoints called by WebSocket service
+        is_collaboration_internal = path.startswith(INTERNAL_PREFIXES) and client_ip in LOCAL_HOSTS
         
-        # Add current request to global rate limit (only for external requests)
-        rate_limit_storage[client_ip].append(current_time)
-    
-    # Process request
-    response = await call_next(request)
-    
-    # Add security headers if enabled
-    if settings.enable_security_headers:
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Referrer-Policy"] = "strict-origin-when-cross-origin"
-        response.headers["Permissions-Policy"] = "camera=(), microphone=(), geolocation=()"
-        response.headers["Content-Security-Policy"] = "default-src 'self'; script-src 'self' 'unsafe-inline'; style-src 'self' 'unsafe-inline'"
+        async def send_wrapper(message):
+            # Add security headers if enabled
+            if message["type"] == "http.response.start" and _SECURITY_HEADERS_ENABLED:
+                message["headers"] = [*message.get("headers", ()), *_STATIC_HEADER_TUPLES]
+            await send(message)
         
-        if settings.environment == "production" or settings.enforce_https:
-            response.headers["Strict-Transport-Security"] = f"max-age={settings.hsts_max_age}; includeSubDomains; preload"
-    
-    return response
+        # Apply rate limiting only for external requests
+        if not is_internal_service and not is_collaboration_internal:
+            limited = await _check_rate_limit(
+                _rate_limit_key(client_ip),
+                path.startswith(AUTH_PREFIX),
+                current_time
+            )
+            if limited:
+                detail, retry_after = limited
+                response = JSONResponse(
+                    status_code=429,
+                    content={"detail": detail},
+                    headers={"Retry-After": str(math.ceil(retry_after))}
+                )
+                return await response(scope, receive, send_wrapper)
+        
+        # Reject oversized uploads from Content-Length before any of the body is spooled
+        body_limit = UPLOAD_BODY_LIMITS.get((scope["method"], path))
+        if body_limit is not None:
+            content_length = headers.get("content-length", "")
+            if content_length.isdigit() and int(content_length) > body_limit:
+                response = JSONResponse(status_code=413, content={"detail": UPLOAD_TOO_LARGE_DETAIL})
+                return await response(scope, receive, send_wrapper)
+            receive = _limit_body(receive, body_limit)
+        
+        await self.app(scope, receive, send_wrapper)
+
+
+# Security middleware
+app.add_middleware(SecurityMiddleware)
 
 # Add CORS middleware - Permissive for Railway deployment
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=getattr(settings, 'allowed_origins', ["*"]),
+    allow_origins=settings.allowed_origins,
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count"],  # Cursor and total for the admin user list
 )
 
-# Create database tables - Graceful failure for Railway
-@app.on_event("startup")
-async def startup_event():
-    print("🚀 Starting application...")
-    # Try to initialize database connection and tables
-    global engine
-    try:
-        from app.database.base import engine
-        from app.models import user, code_submission, collaboration as collaboration_models, assignment, template
-        
-        user.Base.metadata.create_all(bind=engine)
-        code_submission.Base.metadata.create_all(bind=engine)
-        collaboration_models.Base.metadata.create_all(bind=engine)
-        assignment.Base.metadata.create_all(bind=engine)
-        template.Base.metadata.create_all(bind=engine)
-        print("✅ Database tables created successfully")
-    except Exception as e:
-        print(f"⚠️  Database connection failed: {e}")
-        print("💡 Continuing without database features for health check")
-
 # Simple health check (like shop project)
 @app.get("/health")
 async def health_check():
@@ -178,18 +520,31 @@ async def health_check():
 # Include routers - Health check first, others conditional
 app.include_router(health.router, prefix="/api", tags=["health"])
 
-# Load other routers lazily during startup
+# Routers loaded during startup: (module, prefix, tag)
+ROUTERS_TO_LOAD = (
+    ("auth", "/api/auth", "authentication"),
+    ("languages", "/api", "languages"),
+    ("code", "/api", "code"),
+    ("collaboration", "/api", "collaboration"),
+    ("admin", "/api", "admin"),
+    ("assignments", "/api", "assignments"),
+    ("templates", "/api", "templates"),
+)
+
+# Load other routers lazily during startup (called from lifespan)
 async def load_routers():
     try:
-        from app.routers import code, languages, auth, collaboration, admin, assignments, templates
+        # Router modules are independent, so import them on a small thread pool
+        # instead of one after another; include order stays as listed
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            modules = await asyncio.gather(*(
+                loop.run_in_executor(executor, importlib.import_module, f"app.routers.{name}")
+                for name, _, _ in ROUTERS_TO_LOAD
+            ))
         
-        app.include_router(auth.router, prefix="/api/auth", tags=["authentication"])
-        app.include_router(languages.router, prefix="/api", tags=["languages"])
-        app.include_router(code.router, prefix="/api", tags=["code"])
-        app.include_router(collaboration.router, prefix="/api", tags=["collaboration"])
-        app.include_router(admin.router, prefix="/api", tags=["admin"])
-        app.include_router(assignments.router, prefix="/api", tags=["assignments"])
-        app.include_router(templates.router, prefix="/api", tags=["templates"])
+        for (_, prefix, tag), module in zip(ROUTERS_TO_LOAD, modules):
+            app.include_router(module.router, prefix=prefix, tags=[tag])
         print("✅ All routers loaded successfully")
         print("🔗 WebSocket service running separately on dedicated microservice")
         
@@ -197,19 +552,14 @@ async def load_routers():
         print(f"⚠️  Some routers failed to load: {e}")
         print("💡 Health check still available")
 
-# Load routers after startup
-@app.on_event("startup")
-async def load_full_app():
-    await load_routers()
-
 # Root endpoint - Simplified for Railway
 @app.get("/")
 async def root():
     return {
-        "message": f"Welcome to {getattr(settings, 'app_name', 'Script Smith')}",
-        "version": getattr(settings, 'app_version', '1.0.0'),
+        "message": f"Welcome to {settings.app_name}",
+        "version": settings.app_version,
         "status": "running",
-        "environment": getattr(settings, 'environment', 'development')
+        "environment": settings.environment
     }
 
 # Global exception handler
@@ -221,9 +571,19 @@ async def global_exception_handler(request, exc):
     )
 
 if __name__ == "__main__":
+    # In-memory rate limits are per process, so only fan out in production
+    # (where limits are shared through Redis); reload needs a single worker
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and settings.environment != "production":
+        print(f"⚠️  Ignoring WEB_CONCURRENCY={workers} outside production, running a single worker")
+        workers = 1
+    
     uvicorn.run(
         "app.main:app",  # Use the main FastAPI app (no more Socket.IO integration)
-        host=getattr(settings, 'host', '0.0.0.0'),
-        port=int(os.getenv('PORT', getattr(settings, 'port', 8000))),
-        reload=getattr(settings, 'debug', False)
+        host=settings.host,
+        port=int(os.getenv('PORT', settings.port)),
+        reload=settings.debug and workers == 1,
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=workers
     )
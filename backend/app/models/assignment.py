@@ -1,11 +1,49 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, JSON, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Index, insert, update, select, text, Enum as SQLEnum
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
-from app.database.base import Base
+from sqlalchemy.schema import FetchedValue
+from sqlalchemy.orm import relationship, load_only
+from app.database.base import Base, add_updated_at_trigger, JSONBVariant
+from app.models.code_submission import ExecutionStatus
+import enum
+
+
+class AssignmentStatus(str, enum.Enum):
+    UPLOADED = "uploaded"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+
+class PlagiarismStatus(str, enum.Enum):
+    PENDING = "pending"
+    PROCESSING = "processing"
+    COMPLETED = "completed"
+    FAILED = "failed"
 
 
 class Assignment(Base):
     __tablename__ = "assignments"
+    __table_args__ = (
+        # Newest-first assignment list (a btree is scanned backwards for DESC)
+        Index("ix_assignments_created_at", "created_at"),
+        # JSONB indexes for dashboard filters and @> lookups, PostgreSQL only
+        Index(
+            "ix_assignments_execution_errors",
+            text("((execution_summary->>'error')::int)")
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_assignments_plagiarism_report_gin",
+            "plagiarism_report",
+            postgresql_using="gin"
+        ).ddl_if(dialect="postgresql"),
+        Index(
+            "ix_assignments_flagged_submissions",
+            text("((plagiarism_report->>'flagged_submissions')::int)"),
+            postgresql_where=text("plagiarism_status = 'completed'")
+        ).ddl_if(dialect="postgresql"),
+    )
+    # Fetch server-generated columns with RETURNING in the INSERT/UPDATE itself
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False)
@@ -24,19 +62,25 @@ class Assignment(Base):
     processed_students = Column(Integer, default=0)
     
     # Status tracking
-    status = Column(String(50), default="uploaded")  # uploaded, processing, completed, failed
+    status = Column(
+        SQLEnum(AssignmentStatus, values_callable=lambda obj: [e.value for e in obj]),
+        default=AssignmentStatus.UPLOADED, nullable=False, index=True
+    )
     
     # Execution results summary
-    execution_summary = Column(JSON, nullable=True)  # {success: int, error: int, timeout: int}
+    execution_summary = Column(JSONBVariant, nullable=True)  # {success: int, error: int, timeout: int}
     
     # Plagiarism analysis
-    plagiarism_status = Column(String(50), default="pending")  # pending, processing, completed, failed
-    plagiarism_report = Column(JSON, nullable=True)
+    plagiarism_status = Column(
+        SQLEnum(PlagiarismStatus, values_callable=lambda obj: [e.value for e in obj]),
+        default=PlagiarismStatus.PENDING, nullable=False
+    )
+    plagiarism_report = Column(JSONBVariant, nullable=True)
     plagiarism_threshold = Column(Float, default=0.8)  # Similarity threshold for flagging
     
     # Processing timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by trigger
     processing_started_at = Column(DateTime(timezone=True), nullable=True)
     processing_completed_at = Column(DateTime(timezone=True), nullable=True)
     
@@ -50,6 +94,19 @@ class Assignment(Base):
 
 class StudentSubmission(Base):
     __tablename__ = "student_submissions"
+    __table_args__ = (
+        # Submissions per assignment, optionally by status (also covers the FK lookup)
+        Index("ix_student_submissions_assignment_status", "assignment_id", "execution_status"),
+        # Submission list and export, ordered by student name without a sort
+        Index("ix_student_submissions_assignment_name", "assignment_id", "student_name"),
+        # Flagged students per assignment; partial so only flagged rows are indexed
+        Index(
+            "ix_student_submissions_flagged",
+            "assignment_id",
+            postgresql_where=text("is_flagged = true")
+        ).ddl_if(dialect="postgresql"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     assignment_id = Column(Integer, ForeignKey("assignments.id"), nullable=False)
@@ -60,11 +117,14 @@ class StudentSubmission(Base):
     folder_path = Column(String(500), nullable=False)   # Path to student's folder
     
     # Code files information
-    code_files = Column(JSON, nullable=True)  # List of code files found
+    code_files = Column(JSONBVariant, nullable=True)  # List of code files found
     main_file = Column(String(500), nullable=True)  # Primary file to execute
     
     # Execution results
-    execution_status = Column(String(50), default="pending")  # pending, success, error, timeout
+    execution_status = Column(
+        SQLEnum(ExecutionStatus, values_callable=lambda obj: [e.value for e in obj]),
+        default=ExecutionStatus.PENDING, nullable=False
+    )
     execution_output = Column(Text, nullable=True)
     execution_error = Column(Text, nullable=True)
     execution_time = Column(Float, nullable=True)
@@ -73,18 +133,75 @@ class StudentSubmission(Base):
     results_file_path = Column(String(500), nullable=True)  # Path to saved results file
     
     # Plagiarism flags
-    similarity_scores = Column(JSON, nullable=True)  # {student_name: similarity_score}
+    similarity_scores = Column(JSONBVariant, nullable=True)  # {student_name: similarity_score}
     is_flagged = Column(Boolean, default=False)
-    flagged_for = Column(JSON, nullable=True)  # List of similar submissions
+    flagged_for = Column(JSONBVariant, nullable=True)  # List of similar submissions
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by trigger
     executed_at = Column(DateTime(timezone=True), nullable=True)
     
+    @classmethod
+    def bulk_create(cls, session, rows: list, batch_size: int = 500) -> list:
+        """
+        Insert submission rows (dicts of column values) with INSERT ... RETURNING id,
+        bypassing the unit of work. Batches stay well under PostgreSQL's 65535
+        bind parameter limit. Returns the new ids in input order.
+        """
+        ids = []
+        statement = insert(cls).returning(cls.id, sort_by_parameter_order=True)
+        for start in range(0, len(rows), batch_size):
+            ids.extend(session.scalars(statement, rows[start:start + batch_size]))
+        return ids
+    
+    @classmethod
+    def stream_for_assignment(cls, session, assignment_id: int):
+        """
+        Yield an assignment's submissions (summary columns only) in chunks of
+        1000 from a server-side cursor, so exports don't hold every row in memory.
+        """
+        statement = select(cls).options(
+            load_only(cls.id, cls.student_name, cls.execution_status, cls.execution_time, cls.is_flagged)
+        ).where(
+            cls.assignment_id == assignment_id
+        ).order_by(cls.student_name).execution_options(yield_per=1000, stream_results=True)
+        return session.scalars(statement)
+    
+    @classmethod
+    def report_rows(cls, session, assignment_id: int):
+        """
+        An assignment's submissions as column rows for the report: output and
+        error texts are reduced to has_output/has_error flags in the database.
+        """
+        return session.execute(select(
+            cls.student_name,
+            cls.execution_status,
+            cls.execution_time,
+            (func.coalesce(func.length(cls.execution_output), 0) > 0).label("has_output"),
+            (func.coalesce(func.length(cls.execution_error), 0) > 0).label("has_error"),
+            cls.is_flagged,
+            cls.similarity_scores,
+            cls.code_files
+        ).where(cls.assignment_id == assignment_id).order_by(cls.student_name)).all()
+    
+    @classmethod
+    def bulk_apply_results(cls, session, results: list):
+        """
+        Write execution results (dicts of id plus changed columns) with a single
+        executemany UPDATE ... WHERE id = ?, bypassing the unit of work.
+        """
+        if results:
+            session.execute(update(cls), results)
+    
     def __repr__(self):
         return f"<StudentSubmission(id={self.id}, student='{self.student_name}', status='{self.execution_status}')>"
 
 
 # Add back-reference
 Assignment.submissions = relationship("StudentSubmission", back_populates="assignment", cascade="all, delete-orphan")
+
+
+# Database-maintained updated_at
+add_updated_at_trigger(Assignment.__table__)
+add_updated_at_trigger(StudentSubmission.__table__)
@@ -1,27 +1,46 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, Boolean, Index, DDL, event, table, column, text, Enum as SQLEnum
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
-from app.database.base import Base
+from sqlalchemy.schema import FetchedValue
+from sqlalchemy.orm import relationship, deferred
+from app.database.base import Base, add_updated_at_trigger
+import enum
+
+
+class ExecutionStatus(str, enum.Enum):
+    PENDING = "pending"
+    SUCCESS = "success"
+    ERROR = "error"
+    TIMEOUT = "timeout"
 
 
 class CodeSubmission(Base):
     __tablename__ = "code_submissions"
+    __table_args__ = (
+        # Newest-first listings and "since" counts across all users
+        Index("ix_code_submissions_created_at", "created_at"),
+        # A user's history, newest first with id as tie-breaker (also covers the FK lookup)
+        Index("ix_code_submissions_user_created", "user_id", "created_at", "id"),
+        # Activity filtered by status, newest first
+        Index("ix_code_submissions_status_created", "status", "created_at"),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=True)  # Nullable for anonymous submissions
     
-    # Code details
+    # Code details - large text columns are deferred (group "blob") so listing
+    # and counting queries stay narrow; use undefer_group("blob") where they are read
     title = Column(String(255), nullable=True)
     description = Column(Text, nullable=True)
-    code = Column(Text, nullable=False)
-    language = Column(String(50), nullable=False)
-    input_data = Column(Text, nullable=True)
+    code = deferred(Column(Text, nullable=False), group="blob")
+    language = Column(String(50), nullable=False, index=True)  # Grouped by in admin stats
+    input_data = deferred(Column(Text, nullable=True), group="blob")
     
     # Execution results
-    output = Column(Text, nullable=True)
-    error_message = Column(Text, nullable=True)
+    output = deferred(Column(Text, nullable=True), group="blob")
+    error_message = deferred(Column(Text, nullable=True), group="blob")
     execution_time = Column(Float, nullable=True)
-    status = Column(String(50), nullable=True)  # success, error, timeout
+    status = Column(SQLEnum(ExecutionStatus, values_callable=lambda obj: [e.value for e in obj]), nullable=True)  # success, error, timeout
     
     # Metadata
     is_public = Column(Boolean, default=False)
@@ -29,11 +48,40 @@ class CodeSubmission(Base):
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by trigger
     executed_at = Column(DateTime(timezone=True), nullable=True)
     
     # Relationships
-    user = relationship("User", backref="code_submissions")
+    user = relationship("User", back_populates="code_submissions")
     
     def __repr__(self):
         return f"<CodeSubmission(id={self.id}, language='{self.language}', user_id={self.user_id})>"
+
+
+# Database-maintained updated_at
+add_updated_at_trigger(CodeSubmission.__table__)
+
+
+# Per-language submission counts for the admin dashboard. On PostgreSQL this is a
+# materialized view refreshed in the background, so reading it costs O(languages)
+# rather than a GROUP BY over every submission. Created on every create_all
+# (IF NOT EXISTS) so existing databases pick it up too.
+language_stats_view = table("admin_language_stats", column("language"), column("submissions"))
+
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE MATERIALIZED VIEW IF NOT EXISTS admin_language_stats AS "
+    "SELECT language, count(*) AS submissions FROM code_submissions GROUP BY language"
+).execute_if(dialect="postgresql"))
+# REFRESH ... CONCURRENTLY needs a unique index
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_admin_language_stats_language ON admin_language_stats (language)"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "before_drop", DDL(
+    "DROP MATERIALIZED VIEW IF EXISTS admin_language_stats"
+).execute_if(dialect="postgresql"))
+
+
+def refresh_language_stats(db):
+    """Recompute admin_language_stats without blocking readers (PostgreSQL only)"""
+    db.execute(text("REFRESH MATERIALIZED VIEW CONCURRENTLY admin_language_stats"))
+    db.commit()
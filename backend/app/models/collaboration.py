@@ -1,12 +1,33 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, Integer, String, DateTime, Text, LargeBinary, ForeignKey, Boolean, Index, DDL, event, insert, text
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
-from app.database.base import Base
-import uuid
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import FetchedValue
+from sqlalchemy.orm import relationship, deferred
+from app.database.base import Base, add_updated_at_trigger, JSONBVariant
+import base64
+import os
+
+
+# Dialects whose INSERT supports ON CONFLICT DO NOTHING
+_UPSERT_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
 
 
 class CollaborationSession(Base):
     __tablename__ = "collaboration_sessions"
+    __table_args__ = (
+        # A user's sessions, newest first (also covers the FK lookup)
+        Index("ix_collaboration_sessions_owner_created", "owner_id", "created_at"),
+        # Active sessions only; inactive ones are never listed
+        Index(
+            "ix_collaboration_sessions_active_created",
+            "created_at",
+            "id",
+            postgresql_where=text("is_active = true"),
+            sqlite_where=text("is_active = 1")
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     share_id = Column(String(255), unique=True, index=True, nullable=False)  # Public shareable ID
@@ -20,20 +41,23 @@ class CollaborationSession(Base):
     is_public = Column(Boolean, default=False)  # Whether it appears in public listings
     max_collaborators = Column(Integer, default=10)
     
-    # Code state
-    code_content = Column(Text, nullable=True, default="")
+    # Code state - document columns are deferred (group "document") so session
+    # listings don't read them; use undefer_group("document") where they are read
+    code_content = deferred(Column(Text, nullable=True, default=""), group="document")
     
     # Y.js document state for real-time collaboration
-    yjs_state = Column(Text, nullable=True)  # Serialized Y.js document state
+    yjs_state = deferred(Column(LargeBinary, nullable=True), group="document")  # Binary Y.js document update
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by trigger
     last_accessed = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
-    owner = relationship("User", backref="owned_sessions")
-    participants = relationship("CollaborationParticipant", backref="session", cascade="all, delete-orphan")
+    owner = relationship("User", back_populates="owned_sessions")
+    participants = relationship(
+        "CollaborationParticipant", back_populates="session", cascade="all, delete-orphan", lazy="selectin"
+    )
     
     def __repr__(self):
         return f"<CollaborationSession(id={self.id}, share_id='{self.share_id}', owner_id={self.owner_id})>"
@@ -41,11 +65,62 @@ class CollaborationSession(Base):
     @classmethod
     def generate_share_id(cls):
         """Generate a unique shareable ID"""
-        return str(uuid.uuid4())[:8]  # 8 character ID
+        return base64.urlsafe_b64encode(os.urandom(6)).decode("ascii")  # 8 characters, 48 random bits
+
+    @classmethod
+    def insert_with_share_id(cls, db, values: dict, attempts: int = 5):
+        """
+        Insert a session under a freshly generated share_id and return its
+        (id, share_id, is_active, created_at, updated_at) row. A colliding
+        share_id is skipped by ON CONFLICT DO NOTHING and retried with a new
+        one, so there is no SELECT-then-INSERT race. Dialects without ON
+        CONFLICT retry on the unique violation inside a savepoint instead.
+        """
+        make_insert = _UPSERT_INSERTS.get(db.get_bind().dialect.name)
+        returned = (cls.id, cls.share_id, cls.is_active, cls.created_at, cls.updated_at)
+        for _ in range(attempts):
+            if make_insert is None:
+                statement = insert(cls).values(share_id=cls.generate_share_id(), **values).returning(*returned)
+                try:
+                    with db.begin_nested():
+                        return db.execute(statement).one()
+                except IntegrityError:
+                    continue
+            
+            statement = make_insert(cls).on_conflict_do_nothing(index_elements=["share_id"])
+            row = db.execute(
+                statement.values(share_id=cls.generate_share_id(), **values).returning(*returned)
+            ).first()
+            if row is not None:
+                return row
+        raise RuntimeError("Could not generate a unique share ID")
 
 
 class CollaborationParticipant(Base):
     __tablename__ = "collaboration_participants"
+    __table_args__ = (
+        # Participants per session, optionally only connected ones
+        Index("ix_collaboration_participants_session_connected", "session_id", "is_connected"),
+        # Join activity, overall and per user, newest first
+        Index("ix_collaboration_participants_joined_at", "joined_at"),
+        Index("ix_collaboration_participants_user_joined", "user_id", "joined_at"),
+        # One row per signed-in user per session; anonymous participants (no user_id) are not covered
+        Index(
+            "ux_collaboration_participants_session_user",
+            "session_id", "user_id",
+            unique=True,
+            postgresql_where=text("user_id IS NOT NULL"),
+            sqlite_where=text("user_id IS NOT NULL")
+        ),
+        # Anonymous participants are looked up by display name within a session
+        Index(
+            "ix_collaboration_participants_session_anonymous",
+            "session_id", "username",
+            postgresql_where=text("user_id IS NULL"),
+            sqlite_where=text("user_id IS NULL")
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     session_id = Column(Integer, ForeignKey("collaboration_sessions.id"), nullable=False)
@@ -54,8 +129,8 @@ class CollaborationParticipant(Base):
     
     # Connection state
     is_connected = Column(Boolean, default=False)
-    cursor_position = Column(JSON, nullable=True)  # Store cursor position as JSON
-    selection_range = Column(JSON, nullable=True)  # Store selection range as JSON
+    cursor_position = Column(JSONBVariant, nullable=True)  # Store cursor position as JSON
+    selection_range = Column(JSONBVariant, nullable=True)  # Store selection range as JSON
     
     # Appearance
     cursor_color = Column(String(7), nullable=True)  # Hex color for cursor (#FF5722)
@@ -65,7 +140,83 @@ class CollaborationParticipant(Base):
     last_seen = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
+    session = relationship("CollaborationSession", back_populates="participants")
     user = relationship("User")
     
+    @classmethod
+    def upsert_member(cls, db, session_id: int, user_id: int, username: str, cursor_color: str) -> int:
+        """
+        Add a signed-in user to a session, or refresh their existing row, in one
+        INSERT ... ON CONFLICT DO UPDATE. Returns the participant id. A rejoining
+        user keeps their cursor color and is marked disconnected until the
+        WebSocket connects.
+        """
+        dialect = db.get_bind().dialect.name
+        make_insert = _UPSERT_INSERTS.get(dialect)
+        if make_insert is None:
+            raise NotImplementedError(f"upsert_member does not support the {dialect} dialect")
+        statement = make_insert(cls).values(
+            session_id=session_id,
+            user_id=user_id,
+            username=username,
+            cursor_color=cursor_color,
+            is_connected=False
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["session_id", "user_id"],
+            index_where=text("user_id IS NOT NULL"),
+            set_={
+                "username": statement.excluded.username,
+                "is_connected": False,
+                "last_seen": func.now()
+            }
+        )
+        return db.scalar(statement.returning(cls.id))
+    
     def __repr__(self):
         return f"<CollaborationParticipant(id={self.id}, username='{self.username}', session_id={self.session_id})>"
+
+
+# Database-maintained updated_at
+add_updated_at_trigger(CollaborationSession.__table__)
+
+# Keep Y.js state out of line and uncompressed, so frequent saves don't re-run pglz over the blob
+event.listen(CollaborationSession.__table__, "after_create", DDL(
+    "ALTER TABLE collaboration_sessions ALTER COLUMN yjs_state SET STORAGE EXTERNAL"
+).execute_if(dialect="postgresql"))
+
+# yjs_state used to be a text column holding the client's base64 string. Convert
+# it to bytea on existing databases, decoding values that are valid base64 and
+# keeping any others byte for byte
+event.listen(Base.metadata, "after_create", DDL(
+    "DO $$ BEGIN "
+    "IF EXISTS (SELECT 1 FROM information_schema.columns WHERE table_name = 'collaboration_sessions' "
+    "AND column_name = 'yjs_state' AND data_type = 'text') THEN "
+    "ALTER TABLE collaboration_sessions ALTER COLUMN yjs_state TYPE bytea USING CASE "
+    "WHEN length(yjs_state) %% 4 = 0 AND yjs_state ~ '^[A-Za-z0-9+/]*={0,2}$' THEN decode(yjs_state, 'base64') "
+    "ELSE convert_to(yjs_state, 'UTF8') END; "
+    "ALTER TABLE collaboration_sessions ALTER COLUMN yjs_state SET STORAGE EXTERNAL; "
+    "END IF; END $$"
+).execute_if(dialect="postgresql"))
+
+# The member upsert's ON CONFLICT needs ux_collaboration_participants_session_user,
+# but create_all only builds indexes with new tables. Install it on existing
+# databases too, first dropping duplicate (session_id, user_id) rows that the old
+# select-then-insert join could leave behind (the newest row of each is kept)
+event.listen(Base.metadata, "after_create", DDL(
+    "DO $$ BEGIN "
+    "IF NOT EXISTS (SELECT 1 FROM pg_indexes WHERE indexname = 'ux_collaboration_participants_session_user') THEN "
+    "DELETE FROM collaboration_participants a USING collaboration_participants b "
+    "WHERE a.user_id IS NOT NULL AND a.session_id = b.session_id AND a.user_id = b.user_id AND a.id < b.id; "
+    "CREATE UNIQUE INDEX ux_collaboration_participants_session_user "
+    "ON collaboration_participants (session_id, user_id) WHERE user_id IS NOT NULL; "
+    "END IF; END $$"
+).execute_if(dialect="postgresql"))
+event.listen(Base.metadata, "after_create", DDL(
+    "DELETE FROM collaboration_participants WHERE user_id IS NOT NULL AND id NOT IN ("
+    "SELECT max(id) FROM collaboration_participants WHERE user_id IS NOT NULL GROUP BY session_id, user_id)"
+).execute_if(dialect="sqlite"))
+event.listen(Base.metadata, "after_create", DDL(
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_collaboration_participants_session_user "
+    "ON collaboration_participants (session_id, user_id) WHERE user_id IS NOT NULL"
+).execute_if(dialect="sqlite"))
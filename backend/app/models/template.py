@@ -3,13 +3,15 @@ Template model for storing reusable code templates created by admins
 """
 
 from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean
+from sqlalchemy.sql import func
+from sqlalchemy.schema import FetchedValue
 from sqlalchemy.orm import relationship
-from datetime import datetime
-from app.database.base import Base
+from app.database.base import Base, add_updated_at_trigger
 
 
 class Template(Base):
     __tablename__ = "templates"
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), nullable=False, index=True)
@@ -19,12 +21,18 @@ class Template(Base):
     
     # Admin who created the template
     created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
-    creator = relationship("User", back_populates="created_templates")
+    creator = relationship("User", back_populates="created_templates", lazy="selectin")
     
     # Metadata
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), server_onupdate=FetchedValue(), nullable=False
+    )  # Set by trigger
     is_active = Column(Boolean, default=True, nullable=False)
     
     def __repr__(self):
         return f"<Template(id={self.id}, name='{self.name}', language='{self.language}', created_by={self.created_by})>"
+
+
+# Database-maintained updated_at
+add_updated_at_trigger(Template.__table__)
@@ -1,8 +1,14 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, Enum as SQLEnum
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Text, LargeBinary, ForeignKey, Index, Enum as SQLEnum, delete, event, or_, text
 from sqlalchemy.sql import func
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.schema import FetchedValue
 from sqlalchemy.orm import relationship
-from app.database.base import Base
+from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
+from app.database.base import Base, add_updated_at_trigger
+from datetime import datetime
+from typing import Optional
 import enum
+import hashlib
 
 
 class UserRole(enum.Enum):
@@ -11,8 +17,51 @@ class UserRole(enum.Enum):
     ADMIN = "admin"
 
 
+class TokenKind(str, enum.Enum):
+    PASSWORD_RESET = "password_reset"
+    EMAIL_VERIFICATION = "email_verification"
+
+
+# Role membership as bits, so checks are one dict lookup and an AND.
+# The superuser flag counts as admin.
+_ROLE_BITS = {UserRole.USER: 1, UserRole.MODERATOR: 2, UserRole.ADMIN: 4}
+_ADMIN_BITS = _ROLE_BITS[UserRole.ADMIN]
+_MODERATOR_OR_ADMIN_BITS = _ROLE_BITS[UserRole.MODERATOR] | _ROLE_BITS[UserRole.ADMIN]
+
+
+
+def _pg_trgm_installed(ddl, target, bind, **kw) -> bool:
+    """Only create the trigram indexes where pg_trgm could be installed"""
+    if bind is None:
+        return True
+    return bind.scalar(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")) is not None
+
+
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Case-insensitive email lookups and uniqueness (query with func.lower(User.email))
+        Index("ix_users_email_lower", text("lower(email)"), unique=True),
+        # Newest-first listing with keyset pagination on (created_at, id)
+        Index("ix_users_created_id", "created_at", "id"),
+        # Small partial index for admin lookups (User.is_admin in a WHERE clause)
+        Index(
+            "ix_users_admin",
+            "role",
+            postgresql_where=text("role = 'admin' OR is_superuser")
+        ).ddl_if(dialect="postgresql"),
+        # Trigram indexes so the admin search's ILIKE '%term%' avoids a sequential scan
+        *(
+            Index(
+                f"ix_users_{name}_trgm",
+                name,
+                postgresql_using="gin",
+                postgresql_ops={name: "gin_trgm_ops"}
+            ).ddl_if(dialect="postgresql", callable_=_pg_trgm_installed)
+            for name in ("username", "email", "full_name")
+        ),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
@@ -24,38 +73,113 @@ class User(Base):
     is_superuser = Column(Boolean, default=False)  # Keep for backward compatibility
     role = Column(SQLEnum(UserRole, values_callable=lambda obj: [e.value for e in obj]), default=UserRole.USER, nullable=False)
     
-    # Password reset fields
-    reset_token = Column(String(255), nullable=True)
-    reset_token_expires = Column(DateTime(timezone=True), nullable=True)
-    
-    # Email verification
-    verification_token = Column(String(255), nullable=True)
-    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    updated_at = Column(DateTime(timezone=True), server_onupdate=FetchedValue())  # Set by trigger
     last_login = Column(DateTime(timezone=True), nullable=True)
     
     # Profile fields
     bio = Column(Text, nullable=True)
     avatar_url = Column(String(500), nullable=True)
     
-    # Relationships
-    created_templates = relationship("Template", back_populates="creator")
+    # Relationships - User rows are loaded on every authenticated request,
+    # so collections stay lazy; code_submissions is never walked from here
+    code_submissions = relationship("CodeSubmission", back_populates="user", lazy="raise")
+    owned_sessions = relationship("CollaborationSession", back_populates="owner", lazy="select")
+    created_templates = relationship("Template", back_populates="creator", lazy="select")
     
     @property
+    def _role_bits(self) -> int:
+        return _ROLE_BITS.get(self.role, 0) | (_ADMIN_BITS if self.is_superuser else 0)
+    
+    # Hybrids work on instances and in queries, e.g. select(User).where(User.is_admin)
+    @hybrid_property
     def is_admin(self) -> bool:
         """Check if user has admin privileges"""
-        return self.role == UserRole.ADMIN or self.is_superuser
+        return bool(self._role_bits & _ADMIN_BITS)
     
-    @property
+    @is_admin.expression
+    def is_admin(cls):
+        return or_(cls.role == UserRole.ADMIN, cls.is_superuser.is_(True))
+    
+    @hybrid_property
     def is_moderator_or_admin(self) -> bool:
         """Check if user has moderator or admin privileges"""
-        return self.role in [UserRole.ADMIN, UserRole.MODERATOR] or self.is_superuser
+        return bool(self._role_bits & _MODERATOR_OR_ADMIN_BITS)
+    
+    @is_moderator_or_admin.expression
+    def is_moderator_or_admin(cls):
+        return or_(cls.role.in_([UserRole.ADMIN, UserRole.MODERATOR]), cls.is_superuser.is_(True))
     
+    @hybrid_method
     def has_role(self, role: UserRole) -> bool:
         """Check if user has specific role"""
-        return self.role == role or (role == UserRole.ADMIN and self.is_superuser)
+        return bool(self._role_bits & _ROLE_BITS[role])
+    
+    @has_role.expression
+    def has_role(cls, role: UserRole):
+        if role == UserRole.ADMIN:
+            return cls.is_admin
+        return cls.role == role
     
     def __repr__(self):
         return f"<User(id={self.id}, email='{self.email}', username='{self.username}', role='{self.role.value}')>"
+
+
+class UserToken(Base):
+    """
+    Single-use password reset and email verification tokens, kept out of the
+    users row. Only the SHA-256 of a token is stored; lookups are a primary key probe.
+    """
+    __tablename__ = "user_tokens"
+    __mapper_args__ = {"eager_defaults": True}
+
+    token_hash = Column(LargeBinary(32), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(SQLEnum(TokenKind, values_callable=lambda obj: [e.value for e in obj]), nullable=False)
+    expires_at = Column(DateTime(timezone=True), nullable=True)  # None means no expiry
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    
+    @staticmethod
+    def hash_token(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+    
+    @classmethod
+    def issue(cls, db, user_id: int, kind: TokenKind, token: str, expires_at: Optional[datetime] = None):
+        """Store a new token for the user, replacing any earlier token of the same kind"""
+        db.execute(delete(cls).where(cls.user_id == user_id, cls.kind == kind))
+        db.add(cls(token_hash=cls.hash_token(token), user_id=user_id, kind=kind, expires_at=expires_at))
+    
+    @classmethod
+    def consume(cls, db, kind: TokenKind, token: str) -> Optional[int]:
+        """
+        Delete a valid, unexpired token and return its user id (None if there is
+        no such token). DELETE ... RETURNING makes each token usable once.
+        """
+        return db.scalar(
+            delete(cls).where(
+                cls.token_hash == cls.hash_token(token),
+                cls.kind == kind,
+                or_(cls.expires_at.is_(None), cls.expires_at > func.now())  # DB clock, compared as timestamptz
+            ).returning(cls.user_id)
+        )
+    
+    def __repr__(self):
+        return f"<UserToken(user_id={self.user_id}, kind='{self.kind.value}')>"
+
+
+# gin_trgm_ops for the trigram search indexes comes from pg_trgm. Creating an
+# extension needs extra privileges that managed databases may not grant the
+# app role; without it the search still works, just without the indexes
+@event.listens_for(User.__table__, "before_create")
+def _create_pg_trgm(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        print(f"⚠️  Could not create the pg_trgm extension, skipping trigram search indexes: {e.orig}")
+
+# Database-maintained updated_at
+add_updated_at_trigger(User.__table__)
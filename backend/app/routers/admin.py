@@ -1,22 +1,37 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Query, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from sqlalchemy.orm import Session
-from sqlalchemy import desc, func, and_, or_
+from sqlalchemy import desc, func, and_, or_, not_, case, select, update, literal, union_all
 from datetime import datetime, timedelta
+import asyncio
+import csv
+import io
+import json
 
-from app.core.config import settings
-from app.database.base import get_db
-from app.routers.auth import get_current_user
+from app.database.base import get_db, SessionLocal
+from app.routers.auth import get_admin_user
 from app.models.user import User, UserRole
-from app.models.code_submission import CodeSubmission
+from app.models.code_submission import CodeSubmission, ExecutionStatus, language_stats_view
 from app.models.collaboration import CollaborationSession, CollaborationParticipant
-from app.services.admin_service import AdminService
+from app.services.admin_service import admin_service
+from app.services.cache import response_cache
 
-router = APIRouter()
+# Admin responses (activity pages, user lists) can be large; orjson renders them much faster
+router = APIRouter(default_response_class=ORJSONResponse)
 
-# Initialize admin service
-admin_service = AdminService(settings)
+# Stats are expensive aggregates that may lag by a few seconds
+ADMIN_STATS_CACHE_NS = "admin_stats"
+ADMIN_STATS_CACHE_TTL = 30
+
+# Activity exports stream keys from a server-side cursor and load them in batches this big
+ACTIVITY_EXPORT_BATCH_SIZE = 1000
+
+# Concurrent admin queries each hold a pooled connection of their own; cap how many
+# run at once across all requests, so a burst of admin page loads can't drain the pool
+ADMIN_PARALLEL_QUERIES = 4
+_admin_query_slots = asyncio.Semaphore(ADMIN_PARALLEL_QUERIES)
 
 class UserActivityItem(BaseModel):
     id: int
@@ -34,6 +49,7 @@ class UserActivityResponse(BaseModel):
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[str] = None  # Pass as `after` to fetch the following page
 
 class AdminStatsResponse(BaseModel):
     total_users: int
@@ -45,67 +61,98 @@ class AdminStatsResponse(BaseModel):
     error_rate_percentage: float
     popular_languages: List[dict]
 
+class BulkUserStatusRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+class BulkUserStatusResponse(BaseModel):
+    updated_user_ids: List[int]
+    skipped_user_ids: List[int]  # Unknown users, or admins (which cannot be deactivated)
+
 class UserDetailsResponse(BaseModel):
     user: dict
     code_executions: int
     collaboration_sessions: int
     recent_activity: List[UserActivityItem]
 
-# Admin authentication dependency
-async def get_admin_user(
-    current_user: User = Depends(get_current_user)
-):
-    """Verify that the current user has admin access using secure RBAC"""
-    admin_service.verify_admin_access(current_user)
-    return current_user
+# Handlers use the synchronous Session, so DB-bound ones are plain `def` (FastAPI
+# runs them in its threadpool) or hand their DB work to asyncio.to_thread. The
+# get_admin_user dependency is plain `def` as well, so neither the auth lookup nor
+# a handler's queries block the event loop
+
+def _run_in_session(query_fn):
+    """Run query_fn with a short-lived session of its own"""
+    db = SessionLocal()
+    try:
+        return query_fn(db)
+    finally:
+        db.close()
+
+async def _query_concurrently(*query_fns):
+    """Run each query_fn in a worker thread on its own session, at most ADMIN_PARALLEL_QUERIES at a time"""
+    async def run(query_fn):
+        async with _admin_query_slots:
+            return await asyncio.to_thread(_run_in_session, query_fn)
+    return await asyncio.gather(*(run(query_fn) for query_fn in query_fns))
+
+def _popular_languages(db: Session, limit: int = 5):
+    """Top languages by submissions, from the rollup view on PostgreSQL"""
+    if db.get_bind().dialect.name == "postgresql":
+        return db.execute(select(
+            language_stats_view.c.language, language_stats_view.c.submissions
+        ).order_by(desc(language_stats_view.c.submissions)).limit(limit)).all()
+    
+    return db.query(
+        CodeSubmission.language,
+        func.count(CodeSubmission.id).label('count')
+    ).group_by(CodeSubmission.language).order_by(desc('count')).limit(limit).all()
 
 @router.get("/admin/stats", response_model=AdminStatsResponse)
 async def get_admin_stats(
-    db: Session = Depends(get_db),
     admin_user: User = Depends(get_admin_user)
 ):
     """Get overall system statistics"""
     
+    cached = await response_cache.get(ADMIN_STATS_CACHE_NS)
+    if cached is not None:
+        return AdminStatsResponse.model_validate_json(cached)
+    
     # Calculate dates
     today = datetime.utcnow().date()
     today_start = datetime.combine(today, datetime.min.time())
     
-    # Total counts
-    total_users = db.query(User).count()
-    total_executions = db.query(CodeSubmission).count()
-    total_sessions = db.query(CollaborationSession).count()
-    active_sessions = db.query(CollaborationSession).filter(
-        CollaborationSession.is_active == True
-    ).count()
-    
-    # Today's stats
-    executions_today = db.query(CodeSubmission).filter(
-        CodeSubmission.created_at >= today_start
-    ).count()
-    
-    new_users_today = db.query(User).filter(
-        User.created_at >= today_start
-    ).count()
-    
-    # Error rate
-    error_executions = db.query(CodeSubmission).filter(
-        CodeSubmission.status == "error"
-    ).count()
+    # One conditional-aggregate query per table, so each table is scanned once.
+    # The queries are independent, so run them concurrently, each on its own
+    # session (a Session must not be shared between threads)
+    (
+        (total_users, new_users_today),
+        (total_executions, executions_today, error_executions),
+        (total_sessions, active_sessions),
+        language_stats
+    ) = await _query_concurrently(
+        lambda db: db.query(
+            func.count(User.id),
+            func.count(case((User.created_at >= today_start, 1)))
+        ).one(),
+        lambda db: db.query(
+            func.count(CodeSubmission.id),
+            func.count(case((CodeSubmission.created_at >= today_start, 1))),
+            func.count(case((CodeSubmission.status == ExecutionStatus.ERROR, 1)))
+        ).one(),
+        lambda db: db.query(
+            func.count(CollaborationSession.id),
+            func.count(case((CollaborationSession.is_active == True, 1)))
+        ).one(),
+        _popular_languages
+    )
     
     error_rate = (error_executions / total_executions * 100) if total_executions > 0 else 0
     
-    # Popular languages
-    language_stats = db.query(
-        CodeSubmission.language,
-        func.count(CodeSubmission.id).label('count')
-    ).group_by(CodeSubmission.language).order_by(desc('count')).limit(5).all()
-    
     popular_languages = [
         {"language": lang, "count": count}
         for lang, count in language_stats
     ]
     
-    return AdminStatsResponse(
+    stats = AdminStatsResponse(
         total_users=total_users,
         total_code_executions=total_executions,
         total_collaboration_sessions=total_sessions,
@@ -115,24 +162,77 @@ async def get_admin_stats(
         error_rate_percentage=round(error_rate, 2),
         popular_languages=popular_languages
     )
-
-@router.get("/admin/activities", response_model=UserActivityResponse)
-async def get_user_activities(
-    page: int = Query(1, ge=1),
-    page_size: int = Query(50, ge=1, le=200),
-    activity_type: Optional[str] = Query(None),
-    user_id: Optional[int] = Query(None),
-    date_from: Optional[str] = Query(None),
-    date_to: Optional[str] = Query(None),
-    status: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    admin_user: User = Depends(get_admin_user)
-):
-    """Get all user activities with filtering"""
+    await response_cache.set(ADMIN_STATS_CACHE_NS, stats.model_dump_json(), ADMIN_STATS_CACHE_TTL)
     
-    activities = []
-    
-    # Build date filters
+    return stats
+
+# Activity rows are column projections (no ORM instances); code_size is computed
+# in the database so the code itself is never fetched. Items are built with
+# model_construct: the values come from typed columns, and response_model
+# validates the response once on the way out anyway
+def _execution_activity(row) -> UserActivityItem:
+    return UserActivityItem.model_construct(
+        id=row.id,
+        user_id=row.user_id,
+        username=row.username if row.username is not None else "Anonymous",
+        email=row.email,
+        activity_type="code_execution",
+        activity_data={
+            "language": row.language,
+            "code_size": row.code_size,
+            "execution_time": row.execution_time,
+            "input_data": row.has_input
+        },
+        timestamp=row.created_at.isoformat() if row.created_at else "",
+        status=row.status,
+        error_message=row.error_message
+    )
+
+def _session_activity(row) -> UserActivityItem:
+    return UserActivityItem.model_construct(
+        id=row.id,
+        user_id=row.owner_id,
+        username=row.username,
+        email=row.email,
+        activity_type="session_creation",
+        activity_data={
+            "share_id": row.share_id,
+            "title": row.title,
+            "language": row.language,
+            "is_public": row.is_public,
+            "max_collaborators": row.max_collaborators
+        },
+        timestamp=row.created_at.isoformat() if row.created_at else "",
+        status="active" if row.is_active else "inactive",
+        error_message=None
+    )
+
+def _participant_activity(row) -> UserActivityItem:
+    return UserActivityItem.model_construct(
+        id=row.id,
+        user_id=row.user_id,
+        username=row.username,
+        email=row.email,
+        activity_type="session_join",
+        activity_data={
+            "session_share_id": row.session_share_id,
+            "session_title": row.session_title,
+            "cursor_color": row.cursor_color,
+            "is_connected": row.is_connected
+        },
+        timestamp=row.joined_at.isoformat() if row.joined_at else "",
+        status="connected" if row.is_connected else "disconnected",
+        error_message=None
+    )
+
+# Activity type -> (model, timestamp column), for resolving keyset cursors
+_ACTIVITY_TIMESTAMPS = {
+    "code_execution": (CodeSubmission, CodeSubmission.created_at),
+    "session_creation": (CollaborationSession, CollaborationSession.created_at),
+    "session_join": (CollaborationParticipant, CollaborationParticipant.joined_at),
+}
+
+def _activity_date_filters(date_from: Optional[str], date_to: Optional[str]) -> list:
     date_filters = []
     if date_from:
         try:
@@ -148,119 +248,266 @@ async def get_user_activities(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date_to format")
     
-    # Get code executions
+    return date_filters
+
+def _activities_union(activity_type: Optional[str], user_id: Optional[int], status: Optional[ExecutionStatus], date_filters: list):
+    """
+    One narrow (type, id, timestamp) SELECT per activity type, combined with
+    UNION ALL so the feed can be counted, sorted and sliced in SQL.
+    Returns None when the filters rule out every type.
+    """
+    activity_selects = []
+    
+    # Code executions
     if not activity_type or activity_type == "code_execution":
-        execution_query = db.query(CodeSubmission).join(
-            User, CodeSubmission.user_id == User.id, isouter=True
+        execution_select = select(
+            literal("code_execution").label("activity_type"),
+            CodeSubmission.id.label("id"),
+            CodeSubmission.created_at.label("timestamp")
         )
         
         if user_id:
-            execution_query = execution_query.filter(CodeSubmission.user_id == user_id)
+            execution_select = execution_select.where(CodeSubmission.user_id == user_id)
         if status:
-            execution_query = execution_query.filter(CodeSubmission.status == status)
+            execution_select = execution_select.where(CodeSubmission.status == status)
         if date_filters:
-            execution_query = execution_query.filter(and_(*date_filters))
+            execution_select = execution_select.where(and_(*date_filters))
+        
+        activity_selects.append(execution_select)
+    
+    # Session creations
+    if not activity_type or activity_type == "session_creation":
+        session_select = select(
+            literal("session_creation").label("activity_type"),
+            CollaborationSession.id.label("id"),
+            CollaborationSession.created_at.label("timestamp")
+        )
         
-        executions = execution_query.order_by(desc(CodeSubmission.created_at)).all()
+        if user_id:
+            session_select = session_select.where(CollaborationSession.owner_id == user_id)
+        
+        activity_selects.append(session_select)
+    
+    # Session joins
+    if not activity_type or activity_type == "session_join":
+        participant_select = select(
+            literal("session_join").label("activity_type"),
+            CollaborationParticipant.id.label("id"),
+            CollaborationParticipant.joined_at.label("timestamp")
+        )
         
-        for execution in executions:
-            activities.append(UserActivityItem(
-                id=execution.id,
-                user_id=execution.user_id,
-                username=execution.user.username if execution.user else "Anonymous",
-                email=execution.user.email if execution.user else None,
-                activity_type="code_execution",
-                activity_data={
-                    "language": execution.language,
-                    "code_size": len(execution.code) if execution.code else 0,
-                    "execution_time": execution.execution_time,
-                    "input_data": bool(execution.input_data)
-                },
-                timestamp=execution.created_at.isoformat() if execution.created_at else "",
-                status=execution.status,
-                error_message=execution.error_message
-            ))
-    
-    # Get collaboration session activities
-    if not activity_type or activity_type in ["session_creation", "session_join"]:
-        # Session creations
-        if not activity_type or activity_type == "session_creation":
-            session_query = db.query(CollaborationSession).join(User)
-            
-            if user_id:
-                session_query = session_query.filter(CollaborationSession.owner_id == user_id)
-            
-            sessions = session_query.order_by(desc(CollaborationSession.created_at)).all()
-            
-            for session in sessions:
-                activities.append(UserActivityItem(
-                    id=session.id,
-                    user_id=session.owner_id,
-                    username=session.owner.username,
-                    email=session.owner.email,
-                    activity_type="session_creation",
-                    activity_data={
-                        "share_id": session.share_id,
-                        "title": session.title,
-                        "language": session.language,
-                        "is_public": session.is_public,
-                        "max_collaborators": session.max_collaborators
-                    },
-                    timestamp=session.created_at.isoformat() if session.created_at else "",
-                    status="active" if session.is_active else "inactive",
-                    error_message=None
-                ))
+        if user_id:
+            participant_select = participant_select.where(CollaborationParticipant.user_id == user_id)
         
-        # Session joins
-        if not activity_type or activity_type == "session_join":
-            participant_query = db.query(CollaborationParticipant).join(
-                CollaborationSession
-            ).join(User, CollaborationParticipant.user_id == User.id, isouter=True)
-            
-            if user_id:
-                participant_query = participant_query.filter(CollaborationParticipant.user_id == user_id)
-            
-            participants = participant_query.order_by(desc(CollaborationParticipant.joined_at)).all()
-            
-            for participant in participants:
-                activities.append(UserActivityItem(
-                    id=participant.id,
-                    user_id=participant.user_id,
-                    username=participant.username,
-                    email=participant.user.email if participant.user else None,
-                    activity_type="session_join",
-                    activity_data={
-                        "session_share_id": participant.session.share_id,
-                        "session_title": participant.session.title,
-                        "cursor_color": participant.cursor_color,
-                        "is_connected": participant.is_connected
-                    },
-                    timestamp=participant.joined_at.isoformat() if participant.joined_at else "",
-                    status="connected" if participant.is_connected else "disconnected",
-                    error_message=None
-                ))
-    
-    # Sort activities by timestamp (most recent first)
-    activities.sort(key=lambda x: x.timestamp, reverse=True)
-    
-    # Apply pagination
-    total = len(activities)
-    start_idx = (page - 1) * page_size
-    end_idx = start_idx + page_size
-    paginated_activities = activities[start_idx:end_idx]
+        activity_selects.append(participant_select)
+    
+    if not activity_selects:
+        return None
+    return union_all(*activity_selects).subquery()
+
+def _activity_order(activities_union) -> tuple:
+    # Most recent first; ties keep executions, then creations, then joins
+    return (
+        desc(activities_union.c.timestamp).nulls_last(),
+        activities_union.c.activity_type,
+        desc(activities_union.c.id)
+    )
+
+def _load_activities(db: Session, rows) -> dict:
+    """Fetch the fields of (activity_type, id) rows, one query per activity type"""
+    page_ids = {}
+    for row in rows:
+        page_ids.setdefault(row.activity_type, []).append(row.id)
+    
+    loaded = {}
+    if "code_execution" in page_ids:
+        for row in db.execute(select(
+            CodeSubmission.id,
+            CodeSubmission.user_id,
+            User.username,
+            User.email,
+            CodeSubmission.language,
+            func.coalesce(func.length(CodeSubmission.code), 0).label("code_size"),
+            (func.coalesce(func.length(CodeSubmission.input_data), 0) > 0).label("has_input"),
+            CodeSubmission.execution_time,
+            CodeSubmission.created_at,
+            CodeSubmission.status,
+            CodeSubmission.error_message
+        ).outerjoin(User, CodeSubmission.user_id == User.id).where(
+            CodeSubmission.id.in_(page_ids["code_execution"])
+        )):
+            loaded[("code_execution", row.id)] = _execution_activity(row)
+    
+    if "session_creation" in page_ids:
+        for row in db.execute(select(
+            CollaborationSession.id,
+            CollaborationSession.owner_id,
+            User.username,
+            User.email,
+            CollaborationSession.share_id,
+            CollaborationSession.title,
+            CollaborationSession.language,
+            CollaborationSession.is_public,
+            CollaborationSession.max_collaborators,
+            CollaborationSession.is_active,
+            CollaborationSession.created_at
+        ).join(User, CollaborationSession.owner_id == User.id).where(
+            CollaborationSession.id.in_(page_ids["session_creation"])
+        )):
+            loaded[("session_creation", row.id)] = _session_activity(row)
+    
+    if "session_join" in page_ids:
+        for row in db.execute(select(
+            CollaborationParticipant.id,
+            CollaborationParticipant.user_id,
+            CollaborationParticipant.username,
+            User.email,
+            CollaborationSession.share_id.label("session_share_id"),
+            CollaborationSession.title.label("session_title"),
+            CollaborationParticipant.cursor_color,
+            CollaborationParticipant.is_connected,
+            CollaborationParticipant.joined_at
+        ).join(
+            CollaborationSession, CollaborationParticipant.session_id == CollaborationSession.id
+        ).outerjoin(User, CollaborationParticipant.user_id == User.id).where(
+            CollaborationParticipant.id.in_(page_ids["session_join"])
+        )):
+            loaded[("session_join", row.id)] = _participant_activity(row)
+    
+    return loaded
+
+@router.get("/admin/activities", response_model=UserActivityResponse)
+def get_user_activities(
+    page: int = Query(1, ge=1),
+    page_size: int = Query(50, ge=1, le=200),
+    activity_type: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    status: Optional[ExecutionStatus] = Query(None),  # Unknown values are a 422, not a failed enum cast
+    after: Optional[str] = Query(None, description="Cursor from next_cursor; replaces page for deep pages"),
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Get all user activities with filtering"""
+    
+    date_filters = _activity_date_filters(date_from, date_to)
+    activities_union = _activities_union(activity_type, user_id, status, date_filters)
+    if activities_union is None:
+        return UserActivityResponse(activities=[], total=0, page=page, page_size=page_size)
+    
+    page_query = select(activities_union).order_by(*_activity_order(activities_union))
+    
+    if after:
+        # Keyset: continue strictly after the cursor row in the sort order above.
+        # The cursor's timestamp is read back from its table so values compare as stored.
+        cursor_type, _, cursor_id = after.partition(":")
+        if cursor_type not in _ACTIVITY_TIMESTAMPS or not cursor_id.isdigit():
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        cursor_id = int(cursor_id)
+        model, timestamp_column = _ACTIVITY_TIMESTAMPS[cursor_type]
+        cursor_timestamp = select(timestamp_column).where(model.id == cursor_id).scalar_subquery()
+        page_query = page_query.where(or_(
+            activities_union.c.timestamp < cursor_timestamp,
+            and_(
+                activities_union.c.timestamp == cursor_timestamp,
+                or_(
+                    activities_union.c.activity_type > cursor_type,
+                    and_(activities_union.c.activity_type == cursor_type, activities_union.c.id < cursor_id)
+                )
+            )
+        ))
+    else:
+        # The total rides along on every row, saving a separate COUNT query
+        page_query = page_query.add_columns(
+            func.count().over().label("total_count")
+        ).offset((page - 1) * page_size)
+    
+    page_rows = db.execute(page_query.limit(page_size)).all()
+    
+    # Keyset pages (and offsets past the end) have no window total to read
+    if not after and page_rows:
+        total = page_rows[0].total_count
+    else:
+        total = db.scalar(select(func.count()).select_from(activities_union))
+    
+    loaded = _load_activities(db, page_rows)
     
     return UserActivityResponse(
-        activities=paginated_activities,
+        activities=[loaded[(row.activity_type, row.id)] for row in page_rows],
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=f"{page_rows[-1].activity_type}:{page_rows[-1].id}" if len(page_rows) == page_size else None
+    )
+
+@router.get("/admin/activities/export")
+async def export_user_activities(
+    activity_type: Optional[str] = Query(None),
+    user_id: Optional[int] = Query(None),
+    date_from: Optional[str] = Query(None),
+    date_to: Optional[str] = Query(None),
+    status: Optional[ExecutionStatus] = Query(None),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Export every matching activity as CSV, streamed in batches"""
+    
+    date_filters = _activity_date_filters(date_from, date_to)
+    activities_union = _activities_union(activity_type, user_id, status, date_filters)
+    
+    def generate_rows():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow([
+            "activity_type", "id", "timestamp", "user_id", "username", "email",
+            "status", "error_message", "activity_data"
+        ])
+        yield buffer.getvalue()
+        if activities_union is None:
+            return
+        
+        # Own session: the request session is closed before the body is streamed
+        export_db = SessionLocal()
+        try:
+            result = export_db.execute(
+                select(activities_union).order_by(*_activity_order(activities_union)).execution_options(
+                    yield_per=ACTIVITY_EXPORT_BATCH_SIZE
+                )
+            )
+            for batch in result.partitions():
+                loaded = _load_activities(export_db, batch)
+                buffer.seek(0)
+                buffer.truncate()
+                for row in batch:
+                    activity = loaded[(row.activity_type, row.id)]
+                    writer.writerow([
+                        activity.activity_type,
+                        activity.id,
+                        activity.timestamp,
+                        activity.user_id if activity.user_id is not None else "",
+                        activity.username or "",
+                        activity.email or "",
+                        activity.status or "",
+                        activity.error_message or "",
+                        json.dumps(activity.activity_data)
+                    ])
+                yield buffer.getvalue()
+        finally:
+            export_db.close()
+    
+    return StreamingResponse(
+        generate_rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": 'attachment; filename="activities.csv"'}
     )
 
 @router.get("/admin/users", response_model=List[dict])
-async def get_all_users(
+def get_all_users(
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     search: Optional[str] = Query(None),
+    after: Optional[int] = Query(None, description="Cursor from X-Next-Cursor; replaces page for deep pages"),
     db: Session = Depends(get_db),
     admin_user: User = Depends(get_admin_user)
 ):
@@ -276,19 +523,39 @@ async def get_all_users(
         )
         query = query.filter(search_filter)
     
-    offset = (page - 1) * page_size
-    users = query.order_by(desc(User.created_at)).offset(offset).limit(page_size).all()
+    query = query.order_by(desc(User.created_at), desc(User.id))
+    if after is not None:
+        # Keyset: users older than the cursor user, compared on the stored created_at
+        cursor_created_at = select(User.created_at).where(User.id == after).scalar_subquery()
+        query = query.filter(or_(
+            User.created_at < cursor_created_at,
+            and_(User.created_at == cursor_created_at, User.id < after)
+        ))
+        users = query.limit(page_size).all()
+    else:
+        # Offset pages carry the match count on every row via COUNT(*) OVER ()
+        rows = query.add_columns(
+            func.count().over().label("total_count")
+        ).offset((page - 1) * page_size).limit(page_size).all()
+        users = [row.User for row in rows]
+        if rows:
+            response.headers["X-Total-Count"] = str(rows[0].total_count)
+    
+    # The body stays a plain list, so the cursor and total travel in headers
+    if len(users) == page_size:
+        response.headers["X-Next-Cursor"] = str(users[-1].id)
+    
+    # Counts for the whole page in two grouped queries rather than two per user
+    user_ids = [user.id for user in users]
+    execution_counts = dict(db.query(
+        CodeSubmission.user_id, func.count(CodeSubmission.id)
+    ).filter(CodeSubmission.user_id.in_(user_ids)).group_by(CodeSubmission.user_id).all()) if user_ids else {}
+    session_counts = dict(db.query(
+        CollaborationSession.owner_id, func.count(CollaborationSession.id)
+    ).filter(CollaborationSession.owner_id.in_(user_ids)).group_by(CollaborationSession.owner_id).all()) if user_ids else {}
     
     result = []
     for user in users:
-        execution_count = db.query(CodeSubmission).filter(
-            CodeSubmission.user_id == user.id
-        ).count()
-        
-        session_count = db.query(CollaborationSession).filter(
-            CollaborationSession.owner_id == user.id
-        ).count()
-        
         result.append({
             "id": user.id,
             "username": user.username,
@@ -298,8 +565,8 @@ async def get_all_users(
             "is_verified": user.is_verified,
             "created_at": user.created_at.isoformat() if user.created_at else "",
             "last_login": user.last_login.isoformat() if user.last_login else None,
-            "code_executions": execution_count,
-            "collaboration_sessions": session_count
+            "code_executions": execution_counts.get(user.id, 0),
+            "collaboration_sessions": session_counts.get(user.id, 0)
         })
     
     return result
@@ -307,32 +574,45 @@ async def get_all_users(
 @router.get("/admin/users/{user_id}", response_model=UserDetailsResponse)
 async def get_user_details(
     user_id: int,
-    db: Session = Depends(get_db),
+    recent_limit: int = Query(10, ge=1, le=100),
     admin_user: User = Depends(get_admin_user)
 ):
     """Get detailed information about a specific user"""
     
-    user = db.query(User).filter(User.id == user_id).first()
+    # The user, both counts and the recent activity are independent lookups;
+    # run them concurrently, each on its own session
+    user, (execution_count, session_count), recent_executions = await _query_concurrently(
+        lambda db: db.get(User, user_id),
+        # Both counts in one round trip
+        lambda db: db.execute(select(
+            select(func.count(CodeSubmission.id)).where(
+                CodeSubmission.user_id == user_id
+            ).scalar_subquery(),
+            select(func.count(CollaborationSession.id)).where(
+                CollaborationSession.owner_id == user_id
+            ).scalar_subquery()
+        )).one(),
+        # Most recent executions, limited in SQL
+        lambda db: db.execute(select(
+            CodeSubmission.id,
+            CodeSubmission.user_id,
+            CodeSubmission.language,
+            func.coalesce(func.length(CodeSubmission.code), 0).label("code_size"),
+            CodeSubmission.execution_time,
+            CodeSubmission.created_at,
+            CodeSubmission.status,
+            CodeSubmission.error_message
+        ).where(
+            CodeSubmission.user_id == user_id
+        ).order_by(desc(CodeSubmission.created_at)).limit(recent_limit)).all()
+    )
+    
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    # Get counts
-    execution_count = db.query(CodeSubmission).filter(
-        CodeSubmission.user_id == user_id
-    ).count()
-    
-    session_count = db.query(CollaborationSession).filter(
-        CollaborationSession.owner_id == user_id
-    ).count()
-    
-    # Get recent activity (last 20 items)
-    recent_executions = db.query(CodeSubmission).filter(
-        CodeSubmission.user_id == user_id
-    ).order_by(desc(CodeSubmission.created_at)).limit(10).all()
-    
     recent_activity = []
     for execution in recent_executions:
-        recent_activity.append(UserActivityItem(
+        recent_activity.append(UserActivityItem.model_construct(
             id=execution.id,
             user_id=execution.user_id,
             username=user.username,
@@ -340,7 +620,7 @@ async def get_user_details(
             activity_type="code_execution",
             activity_data={
                 "language": execution.language,
-                "code_size": len(execution.code) if execution.code else 0,
+                "code_size": execution.code_size,
                 "execution_time": execution.execution_time
             },
             timestamp=execution.created_at.isoformat() if execution.created_at else "",
@@ -369,6 +649,19 @@ async def get_user_details(
         recent_activity=recent_activity
     )
 
+def _set_user_active(db: Session, user_id: int, is_active: bool) -> str:
+    """Activate or deactivate a user and return their username"""
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    
+    if not is_active and admin_service.has_admin_access(user):
+        raise HTTPException(status_code=400, detail="Cannot deactivate admin user")
+    
+    user.is_active = is_active
+    db.commit()
+    return user.username
+
 @router.delete("/admin/users/{user_id}")
 async def deactivate_user(
     user_id: int,
@@ -377,17 +670,51 @@ async def deactivate_user(
 ):
     """Deactivate a user account"""
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
+    username = await asyncio.to_thread(_set_user_active, db, user_id, False)
+    await response_cache.clear(ADMIN_STATS_CACHE_NS)
     
-    if admin_service.has_admin_access(user):
-        raise HTTPException(status_code=400, detail="Cannot deactivate admin user")
-    
-    user.is_active = False
+    return {"message": f"User {username} has been deactivated"}
+
+
+def _set_users_active(db: Session, user_ids: List[int], is_active: bool) -> List[int]:
+    """Activate or deactivate many users in one UPDATE and return the ids changed"""
+    statement = update(User).where(User.id.in_(user_ids))
+    if not is_active:
+        statement = statement.where(not_(admin_service.admin_access_clause()))
+    updated_ids = db.scalars(
+        statement.values(is_active=is_active).returning(User.id).execution_options(synchronize_session=False)
+    ).all()
     db.commit()
-    
-    return {"message": f"User {user.username} has been deactivated"}
+    return updated_ids
+
+async def _bulk_set_users_active(db: Session, user_ids: List[int], is_active: bool) -> BulkUserStatusResponse:
+    updated_ids = await asyncio.to_thread(_set_users_active, db, user_ids, is_active)
+    await response_cache.clear(ADMIN_STATS_CACHE_NS)
+    updated = set(updated_ids)
+    return BulkUserStatusResponse(
+        updated_user_ids=sorted(updated),
+        skipped_user_ids=sorted(set(user_ids) - updated)
+    )
+
+
+@router.post("/admin/users/bulk-deactivate", response_model=BulkUserStatusResponse)
+async def bulk_deactivate_users(
+    request: BulkUserStatusRequest,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Deactivate several user accounts at once; admin accounts are skipped"""
+    return await _bulk_set_users_active(db, request.user_ids, False)
+
+
+@router.post("/admin/users/bulk-activate", response_model=BulkUserStatusResponse)
+async def bulk_activate_users(
+    request: BulkUserStatusRequest,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Activate several user accounts at once"""
+    return await _bulk_set_users_active(db, request.user_ids, True)
 
 
 @router.post("/admin/users/{user_id}/promote")
@@ -397,7 +724,8 @@ async def promote_user_to_admin(
     admin_user: User = Depends(get_admin_user)
 ):
     """Promote a user to admin role"""
-    user = admin_service.promote_to_admin(db, user_id, admin_user)
+    user = await asyncio.to_thread(admin_service.promote_to_admin, db, user_id, admin_user)
+    await response_cache.clear(ADMIN_STATS_CACHE_NS)
     return {
         "message": f"User {user.username} has been promoted to admin",
         "user": {
@@ -417,7 +745,8 @@ async def demote_user_from_admin(
     admin_user: User = Depends(get_admin_user)
 ):
     """Demote a user from admin role"""
-    user = admin_service.demote_from_admin(db, user_id, admin_user)
+    user = await asyncio.to_thread(admin_service.demote_from_admin, db, user_id, admin_user)
+    await response_cache.clear(ADMIN_STATS_CACHE_NS)
     return {
         "message": f"User {user.username} has been demoted from admin",
         "user": {
@@ -431,7 +760,7 @@ async def demote_user_from_admin(
 
 
 @router.get("/admin/users/admins")
-async def get_admin_users(
+def get_admin_users(
     db: Session = Depends(get_db),
     admin_user: User = Depends(get_admin_user)
 ):
@@ -460,11 +789,7 @@ async def activate_user(
 ):
     """Activate a user account"""
     
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    user.is_active = True
-    db.commit()
+    username = await asyncio.to_thread(_set_user_active, db, user_id, True)
+    await response_cache.clear(ADMIN_STATS_CACHE_NS)
     
-    return {"message": f"User {user.username} has been activated"}
+    return {"message": f"User {username} has been activated"}
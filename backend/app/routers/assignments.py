@@ -1,17 +1,55 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, BackgroundTasks
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, BackgroundTasks, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, field_serializer
 from typing import Optional, List
-from sqlalchemy.orm import Session
-from sqlalchemy import desc
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy.orm import Session, load_only
+from sqlalchemy import desc, func, null, update
+import asyncio
+import csv
+import io
+import os
+import shutil
+import tempfile
+import aiofiles
 
-from app.core.config import settings
-from app.database.base import get_db
-from app.routers.auth import get_current_user
+from app.database.base import get_db, SessionLocal
+from app.routers.auth import get_admin_user
 from app.models.user import User
-from app.models.assignment import Assignment, StudentSubmission
+from app.models.assignment import Assignment, StudentSubmission, AssignmentStatus, PlagiarismStatus
 from app.services.assignment_service import assignment_service
 
-router = APIRouter()
+# Assignment responses embed large JSON (execution summaries, plagiarism reports); orjson renders them much faster
+router = APIRouter(default_response_class=ORJSONResponse)
+
+MAX_ZIP_SIZE = 100 * 1024 * 1024  # 100MB
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+async def _save_upload(zip_file: UploadFile) -> str:
+    """
+    Stream an upload to a temporary file in fixed-size chunks and return its path.
+    The size limit is checked per chunk, so oversized uploads are rejected
+    without being stored in full.
+    """
+    fd, tmp_path = tempfile.mkstemp(suffix=".zip", dir=assignment_service.base_storage_path)
+    os.close(fd)
+    try:
+        size = 0
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            while chunk := await zip_file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_ZIP_SIZE:
+                    raise HTTPException(
+                        status_code=400,
+                        detail="File size too large. Maximum 100MB allowed."
+                    )
+                await f.write(chunk)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return tmp_path
 
 
 class AssignmentCreate(BaseModel):
@@ -22,7 +60,11 @@ class AssignmentCreate(BaseModel):
     plagiarism_threshold: Optional[float] = 0.8
 
 
-class AssignmentResponse(BaseModel):
+class AssignmentSummary(BaseModel):
+    """List view of an assignment, without the (potentially large) plagiarism report"""
+    # Built straight from Assignment rows with model_validate
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     name: str
     description: Optional[str]
@@ -31,13 +73,20 @@ class AssignmentResponse(BaseModel):
     total_students: int
     processed_students: int
     execution_summary: Optional[dict]
-    plagiarism_report: Optional[dict]
     language: Optional[str]
     timeout_seconds: int
     plagiarism_threshold: float
-    created_at: str
-    processing_started_at: Optional[str]
-    processing_completed_at: Optional[str]
+    created_at: datetime
+    processing_started_at: Optional[datetime]
+    processing_completed_at: Optional[datetime]
+    
+    @field_serializer("created_at", "processing_started_at", "processing_completed_at")
+    def serialize_timestamp(self, value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
+
+
+class AssignmentResponse(AssignmentSummary):
+    plagiarism_report: Optional[dict]
 
 
 class StudentSubmissionResponse(BaseModel):
@@ -59,21 +108,6 @@ class AssignmentReportResponse(BaseModel):
     students: List[dict]
 
 
-# Import admin service
-from app.services.admin_service import AdminService
-
-# Initialize admin service  
-admin_service = AdminService(settings)
-
-# Admin authentication dependency
-async def get_admin_user(
-    current_user: User = Depends(get_current_user)
-):
-    """Verify that the current user has admin access using secure RBAC"""
-    admin_service.verify_admin_access(current_user)
-    return current_user
-
-
 @router.post("/assignments", response_model=AssignmentResponse)
 async def create_assignment(
     background_tasks: BackgroundTasks,
@@ -96,12 +130,14 @@ async def create_assignment(
         )
     
     # Check file size (limit to 100MB)
-    if zip_file.size and zip_file.size > 100 * 1024 * 1024:
+    if zip_file.size and zip_file.size > MAX_ZIP_SIZE:
         raise HTTPException(
             status_code=400,
             detail="File size too large. Maximum 100MB allowed."
         )
     
+    zip_path = await _save_upload(zip_file)
+    
     try:
         # Create assignment
         assignment = await assignment_service.create_assignment(
@@ -109,7 +145,7 @@ async def create_assignment(
             name=name,
             description=description,
             created_by_id=admin_user.id,
-            zip_file=zip_file,
+            zip_path=zip_path,
             language=language,
             timeout_seconds=timeout_seconds
         )
@@ -121,37 +157,25 @@ async def create_assignment(
         # Start background processing
         background_tasks.add_task(
             assignment_service.process_assignment,
-            db,
             assignment.id
         )
         
-        return AssignmentResponse(
-            id=assignment.id,
-            name=assignment.name,
-            description=assignment.description,
-            status=assignment.status,
-            plagiarism_status=assignment.plagiarism_status,
-            total_students=assignment.total_students,
-            processed_students=assignment.processed_students,
-            execution_summary=assignment.execution_summary,
-            plagiarism_report=assignment.plagiarism_report,
-            language=assignment.language,
-            timeout_seconds=assignment.timeout_seconds,
-            plagiarism_threshold=assignment.plagiarism_threshold,
-            created_at=assignment.created_at.isoformat() if assignment.created_at else "",
-            processing_started_at=assignment.processing_started_at.isoformat() if assignment.processing_started_at else None,
-            processing_completed_at=assignment.processing_completed_at.isoformat() if assignment.processing_completed_at else None
-        )
+        return AssignmentResponse.model_validate(assignment)
         
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to create assignment: {str(e)}"
         )
+    finally:
+        # Left behind only if create_assignment failed before moving it into place
+        if os.path.exists(zip_path):
+            os.remove(zip_path)
 
 
-@router.get("/assignments", response_model=List[AssignmentResponse])
+@router.get("/assignments", response_model=List[AssignmentSummary])
 async def get_assignments(
+    response: Response,
     skip: int = 0,
     limit: int = 50,
     db: Session = Depends(get_db),
@@ -159,29 +183,30 @@ async def get_assignments(
 ):
     """Get all assignments"""
     
-    assignments = db.query(Assignment).order_by(desc(Assignment.created_at)).offset(skip).limit(limit).all()
+    # Only the summary columns; the plagiarism report JSON can be large.
+    # The total count rides along on every row via COUNT(*) OVER ()
+    rows = db.query(Assignment, func.count().over().label("total_count")).options(load_only(
+        Assignment.id,
+        Assignment.name,
+        Assignment.description,
+        Assignment.status,
+        Assignment.plagiarism_status,
+        Assignment.total_students,
+        Assignment.processed_students,
+        Assignment.execution_summary,
+        Assignment.language,
+        Assignment.timeout_seconds,
+        Assignment.plagiarism_threshold,
+        Assignment.created_at,
+        Assignment.processing_started_at,
+        Assignment.processing_completed_at
+    )).order_by(desc(Assignment.created_at)).offset(skip).limit(limit).all()
     
-    result = []
-    for assignment in assignments:
-        result.append(AssignmentResponse(
-            id=assignment.id,
-            name=assignment.name,
-            description=assignment.description,
-            status=assignment.status,
-            plagiarism_status=assignment.plagiarism_status,
-            total_students=assignment.total_students,
-            processed_students=assignment.processed_students,
-            execution_summary=assignment.execution_summary,
-            plagiarism_report=assignment.plagiarism_report,
-            language=assignment.language,
-            timeout_seconds=assignment.timeout_seconds,
-            plagiarism_threshold=assignment.plagiarism_threshold,
-            created_at=assignment.created_at.isoformat() if assignment.created_at else "",
-            processing_started_at=assignment.processing_started_at.isoformat() if assignment.processing_started_at else None,
-            processing_completed_at=assignment.processing_completed_at.isoformat() if assignment.processing_completed_at else None
-        ))
+    # The body stays a plain list, so the total travels in a header
+    if rows:
+        response.headers["X-Total-Count"] = str(rows[0].total_count)
     
-    return result
+    return [AssignmentSummary.model_validate(row.Assignment) for row in rows]
 
 
 @router.get("/assignments/{assignment_id}", response_model=AssignmentResponse)
@@ -196,23 +221,7 @@ async def get_assignment(
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    return AssignmentResponse(
-        id=assignment.id,
-        name=assignment.name,
-        description=assignment.description,
-        status=assignment.status,
-        plagiarism_status=assignment.plagiarism_status,
-        total_students=assignment.total_students,
-        processed_students=assignment.processed_students,
-        execution_summary=assignment.execution_summary,
-        plagiarism_report=assignment.plagiarism_report,
-        language=assignment.language,
-        timeout_seconds=assignment.timeout_seconds,
-        plagiarism_threshold=assignment.plagiarism_threshold,
-        created_at=assignment.created_at.isoformat() if assignment.created_at else "",
-        processing_started_at=assignment.processing_started_at.isoformat() if assignment.processing_started_at else None,
-        processing_completed_at=assignment.processing_completed_at.isoformat() if assignment.processing_completed_at else None
-    )
+    return AssignmentResponse.model_validate(assignment)
 
 
 @router.get("/assignments/{assignment_id}/report", response_model=AssignmentReportResponse)
@@ -266,6 +275,47 @@ async def get_assignment_submissions(
     return result
 
 
+@router.get("/assignments/{assignment_id}/submissions/export")
+async def export_assignment_submissions(
+    assignment_id: int,
+    db: Session = Depends(get_db),
+    admin_user: User = Depends(get_admin_user)
+):
+    """Export an assignment's submissions as CSV, streamed row by row"""
+    
+    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
+    if not assignment:
+        raise HTTPException(status_code=404, detail="Assignment not found")
+    
+    def generate_rows():
+        # Own session: the request session is closed before the body is streamed
+        export_db = SessionLocal()
+        try:
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(["id", "student_name", "execution_status", "execution_time", "is_flagged"])
+            for submission in StudentSubmission.stream_for_assignment(export_db, assignment_id):
+                writer.writerow([
+                    submission.id,
+                    submission.student_name,
+                    submission.execution_status.value,
+                    submission.execution_time if submission.execution_time is not None else "",
+                    submission.is_flagged
+                ])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            yield buffer.getvalue()
+        finally:
+            export_db.close()
+    
+    return StreamingResponse(
+        generate_rows(),
+        media_type="text/csv",
+        headers={"Content-Disposition": f'attachment; filename="assignment_{assignment_id}_submissions.csv"'}
+    )
+
+
 @router.get("/assignments/{assignment_id}/submissions/{submission_id}/details")
 async def get_submission_details(
     assignment_id: int,
@@ -283,21 +333,31 @@ async def get_submission_details(
     if not submission:
         raise HTTPException(status_code=404, detail="Submission not found")
     
-    # Read the actual code files
+    # Read the actual code files, concurrently
     code_content = {}
     if submission.code_files and submission.folder_path:
-        import os
-        import aiofiles
+        folder = os.path.realpath(submission.folder_path)
         
-        for code_file in submission.code_files:
+        async def read_code_file(code_file: str):
+            # Lexical check only: extracted ZIPs contain no symlinks
+            file_path = os.path.normpath(os.path.join(folder, code_file))
+            # Only files inside the student's folder
+            if os.path.commonpath([folder, file_path]) != folder:
+                return code_file, "Error reading file"
             try:
-                file_path = os.path.join(submission.folder_path, code_file)
-                if os.path.exists(file_path):
-                    async with aiofiles.open(file_path, 'r', encoding='utf-8') as f:
-                        content = await f.read()
-                        code_content[code_file] = content
+                # Student code files are small: one thread hop per file rather than
+                # one per aiofiles open/read/close
+                return code_file, await asyncio.to_thread(Path(file_path).read_text, encoding='utf-8')
+            except FileNotFoundError:
+                return code_file, None
             except Exception:
-                code_content[code_file] = "Error reading file"
+                return code_file, "Error reading file"
+        
+        for code_file, content in await asyncio.gather(
+            *(read_code_file(code_file) for code_file in submission.code_files)
+        ):
+            if content is not None:
+                code_content[code_file] = content
     
     return {
         "submission": {
@@ -316,7 +376,7 @@ async def get_submission_details(
     }
 
 
-@router.post("/assignments/{assignment_id}/reprocess")
+@router.post("/assignments/{assignment_id}/reprocess", status_code=202)
 async def reprocess_assignment(
     assignment_id: int,
     background_tasks: BackgroundTasks,
@@ -325,55 +385,58 @@ async def reprocess_assignment(
 ):
     """Reprocess an assignment (re-run code execution and plagiarism detection)"""
     
-    assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
-    if not assignment:
-        raise HTTPException(status_code=404, detail="Assignment not found")
+    # Claim the assignment and reset its results in one UPDATE. The row goes
+    # straight to PROCESSING, so a second reprocess request fails the status
+    # condition until this run has finished
+    reset = db.execute(update(Assignment).where(
+        Assignment.id == assignment_id,
+        Assignment.status != AssignmentStatus.PROCESSING
+    ).values(
+        status=AssignmentStatus.PROCESSING,
+        processed_students=0,
+        processing_started_at=datetime.utcnow(),
+        processing_completed_at=None,
+        execution_summary=null(),
+        plagiarism_status=PlagiarismStatus.PENDING,
+        plagiarism_report=null()
+    ).execution_options(synchronize_session=False))
     
-    if assignment.status == "processing":
+    if reset.rowcount == 0:
+        if db.query(Assignment.id).filter(Assignment.id == assignment_id).first() is None:
+            raise HTTPException(status_code=404, detail="Assignment not found")
         raise HTTPException(
             status_code=400,
             detail="Assignment is currently being processed"
         )
     
-    # Reset assignment status
-    assignment.status = "uploaded"
-    assignment.processed_students = 0
-    assignment.processing_started_at = None
-    assignment.processing_completed_at = None
-    assignment.execution_summary = None
-    assignment.plagiarism_status = "pending"
-    assignment.plagiarism_report = None
-    
-    # Reset all submission statuses
-    submissions = db.query(StudentSubmission).filter(
-        StudentSubmission.assignment_id == assignment_id
-    ).all()
-    
-    for submission in submissions:
-        submission.execution_status = "pending"
-        submission.execution_output = None
-        submission.execution_error = None
-        submission.execution_time = None
-        submission.executed_at = None
-        submission.similarity_scores = None
-        submission.is_flagged = False
-        submission.flagged_for = None
-    
     db.commit()
     
-    # Start background processing
+    # Submissions are reset by the background task, so the response does not
+    # wait on an UPDATE across every student's row. The claim above keeps other
+    # reprocess requests out until that task has finished
     background_tasks.add_task(
-        assignment_service.process_assignment,
-        db,
-        assignment.id
+        assignment_service.reprocess_assignment,
+        assignment_id
     )
     
     return {"message": "Assignment reprocessing started"}
 
 
+def _cleanup_paths(*paths: Optional[str]):
+    """Remove files and directory trees, ignoring ones already gone"""
+    for path in paths:
+        if not path:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        elif os.path.exists(path):
+            os.remove(path)
+
+
 @router.delete("/assignments/{assignment_id}")
 async def delete_assignment(
     assignment_id: int,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     admin_user: User = Depends(get_admin_user)
 ):
@@ -383,27 +446,22 @@ async def delete_assignment(
     if not assignment:
         raise HTTPException(status_code=404, detail="Assignment not found")
     
-    if assignment.status == "processing":
+    if assignment.status == AssignmentStatus.PROCESSING:
         raise HTTPException(
             status_code=400,
             detail="Cannot delete assignment while it's being processed"
         )
     
     try:
-        # Clean up files
-        import shutil
-        import os
-        
-        if assignment.extracted_path and os.path.exists(assignment.extracted_path):
-            shutil.rmtree(assignment.extracted_path)
-        
-        if assignment.zip_file_path and os.path.exists(assignment.zip_file_path):
-            os.remove(assignment.zip_file_path)
+        paths = (assignment.extracted_path, assignment.zip_file_path)
         
         # Delete from database (cascades to submissions)
         db.delete(assignment)
         db.commit()
         
+        # Clean up files after the response; removing hundreds of student folders takes a while
+        background_tasks.add_task(_cleanup_paths, *paths)
+        
         return {"message": "Assignment deleted successfully"}
         
     except Exception as e:
@@ -5,9 +5,11 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from app.database.base import get_db
+from app.models.user import User
 from app.services.auth import AuthService
+from app.services.admin_service import admin_service
 from app.services.security import SecurityService
-from app.core.config import settings
+from app.core.config import Settings, get_settings
 from app.utils.security_validators import validate_input_security, SecurityValidator
 
 router = APIRouter()
@@ -56,8 +58,42 @@ class EmailVerification(BaseModel):
 class RefreshTokenRequest(BaseModel):
     refresh_token: str
 
+def _authenticate(request: Request, db: Session, auth_token: str):
+    """
+    Resolve an access token to its user, or None. The result is kept on
+    request.state, so the token is decoded and the user loaded once per
+    request even when several auth dependencies run.
+    """
+    cached = getattr(request.state, "auth_user", None)
+    if cached is not None and cached[0] == auth_token:
+        return cached[1]
+    
+    user = None
+    try:
+        payload = SecurityService.verify_token(auth_token, "access") or {}
+        email: Optional[str] = payload.get("sub")
+        user_id = payload.get("user_id")
+    except Exception:
+        email = user_id = None
+    
+    if email is not None and user_id is not None:
+        # Primary key lookup (no query if the session already holds the user); the
+        # email must still match, so tokens issued before an email change stop working
+        user = db.get(User, user_id)
+        if user is not None and user.email.lower() != email.lower():
+            user = None
+    elif email is not None:
+        user = AuthService.get_user_by_email(db, email=email)
+    
+    request.state.auth_user = (auth_token, user)
+    return user
+
+# The auth dependencies load the user through the synchronous Session, so they are
+# plain `def` and FastAPI runs them in its threadpool rather than on the event loop
+
 # Dependency to get current user from token or cookie
-async def get_current_user(
+def get_current_user(
+    request: Request,
     db: Session = Depends(get_db),
     token: Optional[str] = Depends(oauth2_scheme),
     access_token: Optional[str] = Cookie(None)
@@ -74,26 +110,14 @@ async def get_current_user(
     if not auth_token:
         raise credentials_exception
     
-    try:
-        payload = SecurityService.verify_token(auth_token, "access")
-        if payload is None:
-            raise credentials_exception
-        
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-            
-    except Exception:
-        raise credentials_exception
-    
-    user = AuthService.get_user_by_email(db, email=email)
+    user = _authenticate(request, db, auth_token)
     if user is None:
         raise credentials_exception
     
     return user
 
 # Dependency to get current user (optional - returns None if not authenticated)
-async def get_current_user_optional(
+def get_current_user_optional(
     request: Request,
     db: Session = Depends(get_db),
     access_token: Optional[str] = Cookie(None)
@@ -110,20 +134,7 @@ async def get_current_user_optional(
     if not auth_token:
         return None
     
-    try:
-        payload = SecurityService.verify_token(auth_token, "access")
-        if payload is None:
-            return None
-        
-        email: str = payload.get("sub")
-        if email is None:
-            return None
-            
-    except Exception:
-        return None
-    
-    user = AuthService.get_user_by_email(db, email=email)
-    return user
+    return _authenticate(request, db, auth_token)
 
 # Dependency to get current active user
 async def get_current_active_user(current_user = Depends(get_current_user)):
@@ -131,6 +142,13 @@ async def get_current_active_user(current_user = Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+# Dependency to get current admin user. Every admin router uses this one callable,
+# so FastAPI's per-request dependency cache runs the check once per request
+def get_admin_user(current_user = Depends(get_current_user)):
+    """Verify that the current user has admin access using secure RBAC"""
+    admin_service.verify_admin_access(current_user)
+    return current_user
+
 @router.post("/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def register_user(
     user: UserCreate, 
@@ -198,6 +216,7 @@ async def login_user(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings),
     use_cookies: bool = False
 ):
     """Login user and return JWT tokens with optional secure cookie storage"""
@@ -289,7 +308,8 @@ async def login_user(
 @router.post("/refresh", response_model=Token)
 async def refresh_token(
     request: RefreshTokenRequest,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_settings)
 ):
     """Refresh access token using refresh token"""
     payload = SecurityService.verify_token(request.refresh_token, "refresh")
@@ -387,7 +407,8 @@ async def verify_email(
 @router.post("/logout", status_code=status.HTTP_200_OK)
 async def logout(
     response: Response,
-    current_user = Depends(get_current_active_user)
+    current_user = Depends(get_current_active_user),
+    settings: Settings = Depends(get_settings)
 ):
     """Logout user and clear secure cookies"""
     # Clear cookies by setting them to expire immediately
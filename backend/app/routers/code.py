@@ -1,18 +1,21 @@
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, ConfigDict, field_serializer
 from typing import Optional, Dict, Any
-from sqlalchemy.orm import Session
+from datetime import datetime
+from sqlalchemy.orm import Session, undefer_group
+import asyncio
 import time
 
-from app.core.config import settings
+from app.core.config import Settings, get_settings
 from app.database.base import get_db
 from app.services.microservice_executor import microservice_executor
 from app.routers.auth import get_current_user, get_current_user_optional
 from typing import Union
 from app.models.code_submission import CodeSubmission
-from sqlalchemy import desc
+from sqlalchemy import and_, desc, func, or_, select
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 class CodeExecutionRequest(BaseModel):
     code: str
@@ -35,6 +38,9 @@ class CodeValidationResponse(BaseModel):
     warnings: list
 
 class CodeHistoryItem(BaseModel):
+    # Built straight from CodeSubmission rows
+    model_config = ConfigDict(from_attributes=True)
+    
     id: int
     code: str
     language: str
@@ -43,34 +49,50 @@ class CodeHistoryItem(BaseModel):
     error_message: Optional[str]
     execution_time: Optional[float]
     status: Optional[str]
-    created_at: str
-    executed_at: Optional[str]
+    created_at: Optional[datetime]
+    executed_at: Optional[datetime]
+    
+    @field_serializer("created_at")
+    def serialize_created_at(self, value: Optional[datetime]) -> str:
+        return value.isoformat() if value else ""
+    
+    @field_serializer("executed_at")
+    def serialize_executed_at(self, value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
 
 class CodeHistoryResponse(BaseModel):
     history: list[CodeHistoryItem]
     total: int
     page: int
     page_size: int
+    next_cursor: Optional[int] = None  # Pass as `after` to fetch the following page
 
 
+def _save_submission(db: Session, code_submission: CodeSubmission):
+    db.add(code_submission)
+    db.commit()
+
 
 @router.post("/code/execute", response_model=CodeExecutionResponse)
 async def execute_code(
     request: CodeExecutionRequest,
     db: Session = Depends(get_db),
-    current_user = Depends(get_current_user_optional)  # Optional authentication
+    current_user = Depends(get_current_user_optional),  # Optional authentication
+    settings: Settings = Depends(get_settings)
 ):
     """Execute user code in a secure Docker environment"""
     
     # Validate language support
-    if request.language not in settings.supported_languages:
+    if request.language not in settings.supported_language_set:
         raise HTTPException(
             status_code=400,
             detail=f"Language '{request.language}' is not supported"
         )
     
-    # Validate code size
-    code_size_kb = len(request.code.encode('utf-8')) / 1024
+    # Validate code size; ASCII code (the usual case) is one byte per character,
+    # so only other code has to be encoded to measure it
+    code_size = len(request.code) if request.code.isascii() else len(request.code.encode('utf-8'))
+    code_size_kb = code_size / 1024
     if code_size_kb > settings.max_code_size_kb:
         raise HTTPException(
             status_code=400,
@@ -91,7 +113,6 @@ async def execute_code(
         
         # Save execution to database if user is authenticated
         if current_user:
-            from sqlalchemy.sql import func
             code_submission = CodeSubmission(
                 user_id=current_user.id,
                 code=request.code,
@@ -103,8 +124,7 @@ async def execute_code(
                 status=result["status"],
                 executed_at=func.now()
             )
-            db.add(code_submission)
-            db.commit()
+            await asyncio.to_thread(_save_submission, db, code_submission)
         
         return CodeExecutionResponse(
             output=result["output"],
@@ -122,10 +142,10 @@ async def execute_code(
         )
 
 @router.post("/code/validate", response_model=CodeValidationResponse)
-async def validate_code(request: CodeValidationRequest):
+async def validate_code(request: CodeValidationRequest, settings: Settings = Depends(get_settings)):
     """Validate code syntax without executing it"""
     
-    if request.language not in settings.supported_languages:
+    if request.language not in settings.supported_language_set:
         raise HTTPException(
             status_code=400,
             detail=f"Language '{request.language}' is not supported"
@@ -151,9 +171,10 @@ async def validate_code(request: CodeValidationRequest):
         )
 
 @router.get("/code/history", response_model=CodeHistoryResponse)
-async def get_code_history(
+def get_code_history(
     page: int = 1,
     page_size: int = 20,
+    after: Optional[int] = None,  # Cursor from next_cursor; replaces page for deep pages
     db: Session = Depends(get_db),
     current_user = Depends(get_current_user)  # Required authentication
 ):
@@ -165,40 +186,42 @@ async def get_code_history(
     if page_size < 1 or page_size > 100:
         raise HTTPException(status_code=400, detail="Page size must be between 1 and 100")
     
-    # Calculate offset
-    offset = (page - 1) * page_size
-    
-    # Get total count
-    total = db.query(CodeSubmission).filter(
+    query = select(CodeSubmission).options(undefer_group("blob")).where(
         CodeSubmission.user_id == current_user.id
-    ).count()
+    ).order_by(desc(CodeSubmission.created_at), desc(CodeSubmission.id))
     
-    # Get paginated history
-    submissions = db.query(CodeSubmission).filter(
-        CodeSubmission.user_id == current_user.id
-    ).order_by(desc(CodeSubmission.created_at)).offset(offset).limit(page_size).all()
-    
-    # Convert to response format
-    history_items = []
-    for submission in submissions:
-        history_items.append(CodeHistoryItem(
-            id=submission.id,
-            code=submission.code,
-            language=submission.language,
-            input_data=submission.input_data,
-            output=submission.output,
-            error_message=submission.error_message,
-            execution_time=submission.execution_time,
-            status=submission.status,
-            created_at=submission.created_at.isoformat() if submission.created_at else "",
-            executed_at=submission.executed_at.isoformat() if submission.executed_at else None
+    if after is not None:
+        # Keyset: submissions older than the cursor submission, compared on the stored created_at
+        cursor_created_at = select(CodeSubmission.created_at).where(CodeSubmission.id == after).scalar_subquery()
+        query = query.where(or_(
+            CodeSubmission.created_at < cursor_created_at,
+            and_(CodeSubmission.created_at == cursor_created_at, CodeSubmission.id < after)
+        ))
+    else:
+        # The user's total count rides along on every row of an offset page
+        query = query.add_columns(
+            func.count().over().label("total_count")
+        ).offset((page - 1) * page_size)
+    
+    rows = db.execute(query.limit(page_size)).all()
+    submissions = [row.CodeSubmission for row in rows]
+    
+    # Keyset pages (and offsets past the end) have no window total to read
+    if after is None and rows:
+        total = rows[0].total_count
+    elif after is None and page == 1:
+        total = 0
+    else:
+        total = db.scalar(select(func.count()).select_from(CodeSubmission).where(
+            CodeSubmission.user_id == current_user.id
         ))
     
     return CodeHistoryResponse(
-        history=history_items,
+        history=[CodeHistoryItem.model_validate(submission) for submission in submissions],
         total=total,
         page=page,
-        page_size=page_size
+        page_size=page_size,
+        next_cursor=submissions[-1].id if len(submissions) == page_size else None
     )
 
 
@@ -216,9 +239,9 @@ async def check_microservices_health():
 
 
 @router.get("/microservices/info/{language}")
-async def get_microservice_info(language: str):
+async def get_microservice_info(language: str, settings: Settings = Depends(get_settings)):
     """Get information about a specific language microservice"""
-    if language not in settings.supported_languages:
+    if language not in settings.supported_language_set:
         raise HTTPException(
             status_code=400,
             detail=f"Language '{language}' is not supported"
@@ -1,17 +1,24 @@
-from fastapi import APIRouter, HTTPException, Depends, Query, Request
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, field_serializer
 from typing import Optional, List, Any
-from sqlalchemy.orm import Session
-from sqlalchemy import desc, func
+from datetime import datetime
+from sqlalchemy.orm import Session, joinedload, lazyload, undefer_group
+from sqlalchemy import and_, desc, func, or_, select
 
-from app.core.config import settings
+from app.core.config import Settings, get_settings
 from app.database.base import get_db
 from app.routers.auth import get_current_user, get_current_user_optional
 from app.models.user import User
 from app.models.collaboration import CollaborationSession, CollaborationParticipant
+import base64
+import binascii
 import random
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
+
+# None of these handlers await anything, so they are plain `def` and their
+# queries run on FastAPI's threadpool rather than on the event loop
 
 class CreateSessionRequest(BaseModel):
     title: Optional[str] = None
@@ -33,8 +40,12 @@ class SessionResponse(BaseModel):
     code_content: Optional[str]
     owner_username: str
     participant_count: int
-    created_at: str
-    updated_at: Optional[str]
+    created_at: datetime
+    updated_at: Optional[datetime]
+    
+    @field_serializer("created_at", "updated_at")
+    def serialize_timestamp(self, value: Optional[datetime]) -> Optional[str]:
+        return value.isoformat() if value else None
 
 class JoinSessionRequest(BaseModel):
     username: str
@@ -45,7 +56,11 @@ class ParticipantResponse(BaseModel):
     is_connected: bool
     cursor_color: Optional[str]
     is_owner: bool
-    joined_at: str
+    joined_at: datetime
+    
+    @field_serializer("joined_at")
+    def serialize_joined_at(self, value: datetime) -> str:
+        return value.isoformat()
 
 class SessionDetailsResponse(BaseModel):
     session: SessionResponse
@@ -60,7 +75,7 @@ class UpdateCursorRequest(BaseModel):
     cursor_position: Optional[Any] = None
 
 class UpdateSessionStateRequest(BaseModel):
-    yjs_state: Optional[str] = None
+    yjs_state: Optional[str] = None  # Base64-encoded Y.js update
     document_content: Optional[str] = None
 
 # Generate random cursor colors
@@ -74,80 +89,73 @@ def get_random_cursor_color():
     return random.choice(CURSOR_COLORS)
 
 @router.post("/collaboration/sessions", response_model=SessionResponse)
-async def create_session(
+def create_session(
     request: CreateSessionRequest,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: User = Depends(get_current_user),
+    settings: Settings = Depends(get_settings)
 ):
     """Create a new collaboration session"""
     
     # Validate language support
-    if request.language not in settings.supported_languages:
+    if request.language not in settings.supported_language_set:
         raise HTTPException(
             status_code=400,
             detail=f"Language '{request.language}' is not supported"
         )
     
-    # Generate unique share ID
-    share_id = CollaborationSession.generate_share_id()
-    while db.query(CollaborationSession).filter(
-        CollaborationSession.share_id == share_id
-    ).first():
-        share_id = CollaborationSession.generate_share_id()
-    
-    # Create session
-    session = CollaborationSession(
-        share_id=share_id,
-        title=request.title or f"{current_user.username}'s {request.language} session",
-        description=request.description,
-        owner_id=current_user.id,
-        language=request.language,
-        is_public=request.is_public,
-        max_collaborators=request.max_collaborators,
-        code_content=request.initial_code or ""
-    )
-    
-    db.add(session)
-    db.commit()
-    db.refresh(session)
+    # Session and owner participant go in with a single commit; the insert
+    # returns the generated fields, so nothing is read back afterwards
+    title = request.title or f"{current_user.username}'s {request.language} session"
+    code_content = request.initial_code or ""
+    session = CollaborationSession.insert_with_share_id(db, {
+        "title": title,
+        "description": request.description,
+        "owner_id": current_user.id,
+        "language": request.language,
+        "is_public": request.is_public,
+        "max_collaborators": request.max_collaborators,
+        "code_content": code_content
+    })
     
     # Add owner as first participant
-    owner_participant = CollaborationParticipant(
+    db.add(CollaborationParticipant(
         session_id=session.id,
         user_id=current_user.id,
         username=current_user.username,
         cursor_color=get_random_cursor_color(),
         is_connected=False
-    )
-    
-    db.add(owner_participant)
+    ))
     db.commit()
     
     return SessionResponse(
         id=session.id,
         share_id=session.share_id,
-        title=session.title,
-        description=session.description,
-        language=session.language,
+        title=title,
+        description=request.description,
+        language=request.language,
         is_active=session.is_active,
-        is_public=session.is_public,
-        max_collaborators=session.max_collaborators,
-        code_content=session.code_content,
+        is_public=request.is_public,
+        max_collaborators=request.max_collaborators,
+        code_content=code_content,
         owner_username=current_user.username,
         participant_count=1,
-        created_at=session.created_at.isoformat(),
-        updated_at=session.updated_at.isoformat() if session.updated_at else None
+        created_at=session.created_at,
+        updated_at=session.updated_at
     )
 
 @router.get("/collaboration/sessions/{share_id}", response_model=SessionDetailsResponse)
-async def get_session(
+def get_session(
     share_id: str,
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """Get session details"""
     
-    session = db.query(CollaborationSession).filter(
+    # Owner is joined in; participants come with the session's selectin load
+    session = db.query(CollaborationSession).options(
+        undefer_group("document"), joinedload(CollaborationSession.owner)
+    ).filter(
         CollaborationSession.share_id == share_id,
         CollaborationSession.is_active == True
     ).first()
@@ -155,10 +163,7 @@ async def get_session(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Get participants
-    participants = db.query(CollaborationParticipant).filter(
-        CollaborationParticipant.session_id == session.id
-    ).all()
+    participants = session.participants
     
     participant_responses = []
     is_participant = False
@@ -184,7 +189,7 @@ async def get_session(
             is_connected=participant.is_connected,
             cursor_color=participant.cursor_color,
             is_owner=is_owner,
-            joined_at=participant.joined_at.isoformat()
+            joined_at=participant.joined_at
         ))
     
     session_response = SessionResponse(
@@ -199,8 +204,8 @@ async def get_session(
         code_content=session.code_content,
         owner_username=session.owner.username,
         participant_count=len(participants),
-        created_at=session.created_at.isoformat(),
-        updated_at=session.updated_at.isoformat() if session.updated_at else None
+        created_at=session.created_at,
+        updated_at=session.updated_at
     )
     
     return SessionDetailsResponse(
@@ -211,7 +216,7 @@ async def get_session(
     )
 
 @router.post("/collaboration/sessions/{share_id}/join")
-async def join_session(
+def join_session(
     share_id: str,
     request: JoinSessionRequest,
     db: Session = Depends(get_db),
@@ -228,20 +233,23 @@ async def join_session(
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Check if session is full
-    participant_count = db.query(CollaborationParticipant).filter(
+    participant_count = db.scalar(select(func.count()).select_from(CollaborationParticipant).where(
         CollaborationParticipant.session_id == session.id
-    ).count()
+    ))
     
     if participant_count >= session.max_collaborators:
         raise HTTPException(status_code=400, detail="Session is full")
     
-    # Check if user is already a participant
-    existing_participant = None
     if current_user:
-        existing_participant = db.query(CollaborationParticipant).filter(
-            CollaborationParticipant.session_id == session.id,
-            CollaborationParticipant.user_id == current_user.id
-        ).first()
+        # Signed-in users are upserted on (session_id, user_id) in a single statement
+        participant_id = CollaborationParticipant.upsert_member(
+            db,
+            session_id=session.id,
+            user_id=current_user.id,
+            username=request.username,
+            cursor_color=get_random_cursor_color()
+        )
+        db.commit()
     else:
         # For anonymous users, check by username in this session
         existing_participant = db.query(CollaborationParticipant).filter(
@@ -249,27 +257,26 @@ async def join_session(
             CollaborationParticipant.username == request.username,
             CollaborationParticipant.user_id.is_(None)
         ).first()
-    
-    if existing_participant:
-        # Update existing participant
-        existing_participant.username = request.username
-        existing_participant.is_connected = False  # Will be set to True by WebSocket
-        db.commit()
-        participant_id = existing_participant.id
-    else:
-        # Create new participant
-        participant = CollaborationParticipant(
-            session_id=session.id,
-            user_id=current_user.id if current_user else None,
-            username=request.username,
-            cursor_color=get_random_cursor_color(),
-            is_connected=False
-        )
         
-        db.add(participant)
-        db.commit()
-        db.refresh(participant)
-        participant_id = participant.id
+        if existing_participant:
+            # Update existing participant
+            existing_participant.is_connected = False  # Will be set to True by WebSocket
+            db.commit()
+            participant_id = existing_participant.id
+        else:
+            # Create new participant
+            participant = CollaborationParticipant(
+                session_id=session.id,
+                user_id=None,
+                username=request.username,
+                cursor_color=get_random_cursor_color(),
+                is_connected=False
+            )
+            
+            db.add(participant)
+            db.commit()
+            db.refresh(participant)
+            participant_id = participant.id
     
     return {
         "participant_id": participant_id, 
@@ -279,18 +286,31 @@ async def join_session(
     }
 
 @router.get("/collaboration/sessions", response_model=List[SessionResponse])
-async def list_sessions(
+def list_sessions(
+    response: Response,
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
     public_only: bool = Query(False),
+    after: Optional[int] = Query(None, description="Cursor from X-Next-Cursor; replaces page for deep pages"),
     db: Session = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """List collaboration sessions"""
     
-    query = db.query(CollaborationSession).filter(
+    # Participant counts and owner names come back with the page in one query
+    query = db.query(
+        CollaborationSession,
+        func.count(CollaborationParticipant.id).label("participant_count"),
+        User.username.label("owner_username")
+    ).join(
+        User, User.id == CollaborationSession.owner_id
+    ).outerjoin(
+        CollaborationParticipant, CollaborationParticipant.session_id == CollaborationSession.id
+    ).options(
+        lazyload(CollaborationSession.participants)
+    ).filter(
         CollaborationSession.is_active == True
-    )
+    ).group_by(CollaborationSession.id, User.username)
     
     if public_only:
         query = query.filter(CollaborationSession.is_public == True)
@@ -304,16 +324,27 @@ async def list_sessions(
         # Anonymous users can only see public sessions
         query = query.filter(CollaborationSession.is_public == True)
     
-    # Calculate offset and get sessions
-    offset = (page - 1) * page_size
-    sessions = query.order_by(desc(CollaborationSession.created_at)).offset(offset).limit(page_size).all()
+    query = query.order_by(desc(CollaborationSession.created_at), desc(CollaborationSession.id))
+    if after is not None:
+        # Keyset: sessions older than the cursor session, compared on the stored created_at
+        cursor_created_at = select(CollaborationSession.created_at).where(
+            CollaborationSession.id == after
+        ).scalar_subquery()
+        query = query.filter(or_(
+            CollaborationSession.created_at < cursor_created_at,
+            and_(CollaborationSession.created_at == cursor_created_at, CollaborationSession.id < after)
+        ))
+    else:
+        query = query.offset((page - 1) * page_size)
+    
+    rows = query.limit(page_size).all()
+    
+    # The body stays a plain list, so the cursor travels in a header
+    if len(rows) == page_size:
+        response.headers["X-Next-Cursor"] = str(rows[-1][0].id)
     
     session_responses = []
-    for session in sessions:
-        participant_count = db.query(CollaborationParticipant).filter(
-            CollaborationParticipant.session_id == session.id
-        ).count()
-        
+    for session, participant_count, owner_username in rows:
         session_responses.append(SessionResponse(
             id=session.id,
             share_id=session.share_id,
@@ -324,16 +355,16 @@ async def list_sessions(
             is_public=session.is_public,
             max_collaborators=session.max_collaborators,
             code_content="",  # Don't include code content in list view
-            owner_username=session.owner.username,
+            owner_username=owner_username,
             participant_count=participant_count,
-            created_at=session.created_at.isoformat(),
-            updated_at=session.updated_at.isoformat() if session.updated_at else None
+            created_at=session.created_at,
+            updated_at=session.updated_at
         ))
     
     return session_responses
 
 @router.delete("/collaboration/sessions/{share_id}")
-async def delete_session(
+def delete_session(
     share_id: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
@@ -356,7 +387,7 @@ async def delete_session(
 # API endpoints for WebSocket service integration
 
 @router.put("/collaboration/participants/{participant_id}/status")
-async def update_participant_status(
+def update_participant_status(
     participant_id: int,
     request: UpdateParticipantStatusRequest,
     db: Session = Depends(get_db)
@@ -379,7 +410,7 @@ async def update_participant_status(
     return {"success": True, "participant_id": participant_id, "is_connected": request.is_connected}
 
 @router.put("/collaboration/participants/{participant_id}/cursor")
-async def update_participant_cursor(
+def update_participant_cursor(
     participant_id: int,
     request: UpdateCursorRequest,
     db: Session = Depends(get_db)
@@ -399,7 +430,7 @@ async def update_participant_cursor(
     return {"success": True, "participant_id": participant_id}
 
 @router.get("/collaboration/sessions/{session_id}/participants", response_model=List[ParticipantResponse])
-async def get_session_participants(
+def get_session_participants(
     session_id: int,
     db: Session = Depends(get_db)
 ):
@@ -427,13 +458,13 @@ async def get_session_participants(
             is_connected=participant.is_connected,
             cursor_color=participant.cursor_color,
             is_owner=is_owner,
-            joined_at=participant.joined_at.isoformat()
+            joined_at=participant.joined_at
         ))
     
     return participant_responses
 
 @router.put("/collaboration/sessions/{session_id}/state")
-async def update_session_state(
+def update_session_state(
     session_id: int,
     request: UpdateSessionStateRequest,
     db: Session = Depends(get_db)
@@ -450,7 +481,10 @@ async def update_session_state(
     
     # Update Y.js state if provided (legacy support)
     if request.yjs_state:
-        session.yjs_state = request.yjs_state
+        try:
+            session.yjs_state = base64.b64decode(request.yjs_state, validate=True)
+        except binascii.Error:
+            raise HTTPException(status_code=400, detail="yjs_state must be base64-encoded")
     
     # Update document content if provided (new simple sync model)
     if request.document_content is not None:
@@ -463,13 +497,13 @@ async def update_session_state(
     return {"success": True, "session_id": session_id, "document_saved": request.document_content is not None}
 
 @router.get("/collaboration/sessions/{session_id}/state")
-async def get_session_state(
+def get_session_state(
     session_id: int,
     db: Session = Depends(get_db)
 ):
     """Get session state and document content (called by WebSocket service)"""
     
-    session = db.query(CollaborationSession).filter(
+    session = db.query(CollaborationSession).options(undefer_group("document")).filter(
         CollaborationSession.id == session_id,
         CollaborationSession.is_active == True
     ).first()
@@ -477,9 +511,15 @@ async def get_session_state(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    # Rows saved while yjs_state was a text column (still possible on SQLite,
+    # which never changes an existing column's type) hold the client's base64 string
+    yjs_state = session.yjs_state
+    if isinstance(yjs_state, bytes):
+        yjs_state = base64.b64encode(yjs_state).decode("ascii")
+    
     return {
         "session_id": session_id,
         "document_content": session.code_content or "",
-        "yjs_state": session.yjs_state,
+        "yjs_state": yjs_state or None,
         "last_updated": session.updated_at.isoformat() if session.updated_at else None
     }
@@ -1,5 +1,5 @@
-from fastapi import APIRouter
-from app.core.config import settings
+from fastapi import APIRouter, Depends
+from app.core.config import Settings, get_settings
 
 router = APIRouter()
 
@@ -107,7 +107,7 @@ fn main() {
 }
 
 @router.get("/languages")
-async def get_supported_languages():
+async def get_supported_languages(settings: Settings = Depends(get_settings)):
     """Get list of supported programming languages"""
     languages = []
     for lang_id in settings.supported_languages:
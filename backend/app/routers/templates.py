@@ -6,18 +6,13 @@ from datetime import datetime
 import os
 
 from app.database.base import get_db
-from app.routers.auth import get_current_user
+from app.routers.auth import get_current_user, get_admin_user
 from app.models.user import User
 from app.models.template import Template
 from app.services.template_service import TemplateService
-from app.services.admin_service import AdminService
-from app.core.config import settings
 
 router = APIRouter()
 
-# Initialize admin service
-admin_service = AdminService(settings)
-
 # Pydantic models for request/response
 class TemplateCreate(BaseModel):
     name: str
@@ -62,13 +57,6 @@ class TemplateStatsResponse(BaseModel):
     templates_by_language: List[dict]
 
 
-# Helper function to check admin access
-async def get_admin_user(current_user: User = Depends(get_current_user)):
-    """Verify user has admin access"""
-    admin_service.verify_admin_access(current_user)
-    return current_user
-
-
 # Admin endpoints
 @router.post("/admin/templates", response_model=TemplateResponse, status_code=status.HTTP_201_CREATED)
 async def create_template(
@@ -9,10 +9,11 @@ This service implements secure admin functionality including:
 """
 
 from typing import List, Optional
+from sqlalchemy import func, or_
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
 from app.models.user import User, UserRole
-from app.core.config import Settings
+from app.core.config import Settings, get_settings
 
 
 class AdminService:
@@ -20,10 +21,14 @@ class AdminService:
     
     def __init__(self, settings: Settings):
         self.settings = settings
+        # Normalized once; admin checks run on every admin request
+        self._initial_admin_emails = frozenset(
+            admin_email.lower().strip() for admin_email in settings.admin_emails
+        )
     
     def is_initial_admin_email(self, email: str) -> bool:
         """Check if email is in the initial admin emails from environment"""
-        return email.lower().strip() in [admin_email.lower().strip() for admin_email in self.settings.admin_emails]
+        return email.lower().strip() in self._initial_admin_emails
     
     def verify_admin_access(self, user: User) -> None:
         """
@@ -116,19 +121,15 @@ class AdminService:
     
     def get_admin_users(self, db: Session) -> List[User]:
         """Get all users with admin privileges"""
-        # Get role-based admins and superusers
-        role_admins = db.query(User).filter(
-            (User.role == UserRole.ADMIN) | (User.is_superuser == True)
-        ).all()
-        
-        # Get environment-based admins
-        env_admins = db.query(User).filter(
-            User.email.in_([email.lower() for email in self.settings.admin_emails])
-        ).all()
-        
-        # Combine and deduplicate
-        all_admins = {user.id: user for user in role_admins + env_admins}
-        return list(all_admins.values())
+        # Role-based admins, superusers and environment-based admins in one query
+        return db.query(User).filter(self.admin_access_clause()).all()
+    
+    def admin_access_clause(self):
+        """SQL form of has_admin_access, for filtering users in queries"""
+        return or_(
+            User.is_admin,
+            func.lower(User.email).in_(self._initial_admin_emails)
+        )
     
     def ensure_initial_admin_access(self, db: Session) -> None:
         """
@@ -136,9 +137,13 @@ class AdminService:
         This should be called during app startup or user login
         """
         for admin_email in self.settings.admin_emails:
-            user = db.query(User).filter(User.email == admin_email.lower().strip()).first()
+            user = db.query(User).filter(func.lower(User.email) == admin_email.lower().strip()).first()
             if user and not user.is_admin:
                 # Grant admin access to initial admin emails
                 if user.role != UserRole.ADMIN:
                     user.role = UserRole.ADMIN
                     db.commit()
+
+
+# Global instance
+admin_service = AdminService(get_settings())
@@ -4,19 +4,54 @@ import asyncio
 import json
 import aiofiles
 import shutil
+import time
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 from pathlib import Path
 import tempfile
+from collections import Counter
 
+from sqlalchemy import null, update
 from sqlalchemy.orm import Session
-from fastapi import UploadFile
 
-from app.models.assignment import Assignment, StudentSubmission
+from app.database.base import SessionLocal
+from app.models.assignment import Assignment, AssignmentStatus, StudentSubmission
+from app.models.code_submission import ExecutionStatus
 from app.services.code_execution import code_execution_service
 from app.services.plagiarism_service import PlagiarismService
 
 
+class FlushBatch:
+    """
+    Collects per-student result rows and writes them with one bulk UPDATE per
+    batch, committing progress once per batch instead of once per student.
+    A batch is also flushed once max_age seconds have passed since the last
+    flush, so the processed_students count the UI polls keeps moving.
+    """
+    
+    def __init__(self, db: Session, assignment: Assignment, size: int = 500, max_age: float = 2.0):
+        self.db = db
+        self.assignment = assignment
+        self.size = size
+        self.max_age = max_age
+        self.rows: List[Dict[str, Any]] = []
+        self.last_flush = time.monotonic()
+    
+    def add(self, row: Dict[str, Any]):
+        self.rows.append(row)
+        if len(self.rows) >= self.size or time.monotonic() - self.last_flush >= self.max_age:
+            self.flush()
+    
+    def flush(self):
+        self.last_flush = time.monotonic()
+        if not self.rows:
+            return
+        StudentSubmission.bulk_apply_results(self.db, self.rows)
+        self.assignment.processed_students += len(self.rows)
+        self.db.commit()
+        self.rows = []
+
+
 class AssignmentService:
     def __init__(self):
         self.base_storage_path = "/tmp/assignments"
@@ -29,11 +64,11 @@ class AssignmentService:
         name: str,
         description: str,
         created_by_id: int,
-        zip_file: UploadFile,
+        zip_path: str,
         language: str = None,
         timeout_seconds: int = 30
     ) -> Assignment:
-        """Create a new assignment from uploaded ZIP file"""
+        """Create a new assignment from an uploaded ZIP file already saved at zip_path"""
         
         # Create assignment record
         assignment = Assignment(
@@ -53,11 +88,10 @@ class AssignmentService:
             assignment_dir = os.path.join(self.base_storage_path, f"assignment_{assignment.id}")
             os.makedirs(assignment_dir, exist_ok=True)
             
-            # Save ZIP file
+            # Move the saved upload into place (a rename, it is on the same filesystem)
+            uploaded_path = zip_path
             zip_path = os.path.join(assignment_dir, f"{name}.zip")
-            async with aiofiles.open(zip_path, 'wb') as f:
-                content = await zip_file.read()
-                await f.write(content)
+            shutil.move(uploaded_path, zip_path)
             
             # Extract ZIP file
             extracted_path = os.path.join(assignment_dir, "extracted")
@@ -68,8 +102,8 @@ class AssignmentService:
             assignment.extracted_path = extracted_path
             
             # Analyze student submissions
-            student_submissions = await self._analyze_submissions(db, assignment, extracted_path)
-            assignment.total_students = len(student_submissions)
+            submission_ids = await self._analyze_submissions(db, assignment, extracted_path)
+            assignment.total_students = len(submission_ids)
             
             db.commit()
             
@@ -83,20 +117,28 @@ class AssignmentService:
     
     async def _extract_zip(self, zip_path: str, extract_path: str):
         """Extract ZIP file to specified directory"""
+        # Decompressing hundreds of entries would block the event loop
+        await asyncio.to_thread(self._extract_zip_sync, zip_path, extract_path)
+    
+    @staticmethod
+    def _extract_zip_sync(zip_path: str, extract_path: str):
         os.makedirs(extract_path, exist_ok=True)
         
+        # Entry by entry straight from the file on disk; each member is
+        # decompressed in chunks, so memory doesn't grow with the archive
         with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_path)
+            for info in zip_ref.infolist():
+                zip_ref.extract(info, extract_path)
     
     async def _analyze_submissions(
         self, 
         db: Session, 
         assignment: Assignment, 
         extracted_path: str
-    ) -> List[StudentSubmission]:
+    ) -> List[int]:
         """Analyze extracted submissions and create student submission records"""
         
-        submissions = []
+        rows = []
         
         # Look for student folders
         for item in os.listdir(extracted_path):
@@ -113,21 +155,20 @@ class AssignmentService:
                     # Determine main file to execute
                     main_file = await self._determine_main_file(code_files, assignment.language)
                     
-                    # Create student submission record
-                    submission = StudentSubmission(
-                        assignment_id=assignment.id,
-                        student_name=student_name,
-                        folder_path=item_path,
-                        code_files=code_files,
-                        main_file=main_file,
-                        execution_status="pending"
-                    )
-                    
-                    db.add(submission)
-                    submissions.append(submission)
-        
+                    # Collect student submission record
+                    rows.append({
+                        "assignment_id": assignment.id,
+                        "student_name": student_name,
+                        "folder_path": item_path,
+                        "code_files": code_files,
+                        "main_file": main_file,
+                        "execution_status": "pending"
+                    })
+        
+        # Insert all records in batches instead of flushing one ORM object at a time
+        submission_ids = StudentSubmission.bulk_create(db, rows)
         db.commit()
-        return submissions
+        return submission_ids
     
     async def _find_code_files(self, folder_path: str, language: str = None) -> List[str]:
         """Find code files in a student's folder"""
@@ -188,16 +229,59 @@ class AssignmentService:
         # Default to first file
         return code_files[0]
     
-    async def process_assignment(self, db: Session, assignment_id: int):
-        """Process all student submissions in an assignment"""
+    async def process_assignment(self, assignment_id: int):
+        """Process all student submissions in an assignment (run as a background task)"""
         
+        # Own session: the request's session is closed once the response has been sent
+        db = SessionLocal()
+        try:
+            await self._process_assignment(db, assignment_id)
+        finally:
+            db.close()
+    
+    async def reprocess_assignment(self, assignment_id: int):
+        """Reset every submission's results, then process the assignment again"""
+        
+        # The request has already claimed the assignment as PROCESSING, so a
+        # failed reset must release it or it could never be reprocessed again
+        db = SessionLocal()
+        try:
+            try:
+                db.execute(update(StudentSubmission).where(
+                    StudentSubmission.assignment_id == assignment_id
+                ).values(
+                    execution_status=ExecutionStatus.PENDING,
+                    execution_output=None,
+                    execution_error=None,
+                    execution_time=None,
+                    executed_at=None,
+                    similarity_scores=null(),
+                    is_flagged=False,
+                    flagged_for=null()
+                ).execution_options(synchronize_session=False))
+                db.commit()
+            except Exception:
+                db.rollback()
+                db.execute(update(Assignment).where(Assignment.id == assignment_id).values(
+                    status=AssignmentStatus.FAILED
+                ))
+                db.commit()
+                raise
+            
+            await self._process_assignment(db, assignment_id)
+        finally:
+            db.close()
+    
+    async def _process_assignment(self, db: Session, assignment_id: int):
         assignment = db.query(Assignment).filter(Assignment.id == assignment_id).first()
         if not assignment:
             raise ValueError(f"Assignment {assignment_id} not found")
         
-        assignment.status = "processing"
-        assignment.processing_started_at = datetime.utcnow()
-        db.commit()
+        # Reprocess requests claim the assignment before scheduling the run
+        if assignment.status != AssignmentStatus.PROCESSING:
+            assignment.status = AssignmentStatus.PROCESSING
+            assignment.processing_started_at = datetime.utcnow()
+            db.commit()
         
         try:
             # Get all student submissions
@@ -205,16 +289,16 @@ class AssignmentService:
                 StudentSubmission.assignment_id == assignment_id
             ).all()
             
-            # Process each submission
+            # Process each submission, writing results back in batches
             results = {"success": 0, "error": 0, "timeout": 0}
+            batch = FlushBatch(db, assignment)
             
             for submission in submissions:
-                result = await self._process_student_submission(db, submission)
-                results[result] += 1
-                
-                # Update progress
-                assignment.processed_students += 1
-                db.commit()
+                row = await self._process_student_submission(submission)
+                results[row["execution_status"]] += 1
+                batch.add(row)
+            
+            batch.flush()
             
             # Update assignment status
             assignment.status = "completed"
@@ -233,18 +317,15 @@ class AssignmentService:
             db.commit()
             raise e
     
-    async def _process_student_submission(
-        self, 
-        db: Session, 
-        submission: StudentSubmission
-    ) -> str:
-        """Process a single student submission"""
+    async def _process_student_submission(self, submission: StudentSubmission) -> Dict[str, Any]:
+        """Process a single student submission and return its result columns"""
         
         if not submission.main_file:
-            submission.execution_status = "error"
-            submission.execution_error = "No main file found"
-            db.commit()
-            return "error"
+            return {
+                "id": submission.id,
+                "execution_status": "error",
+                "execution_error": "No main file found"
+            }
         
         try:
             # Read the main code file
@@ -261,24 +342,25 @@ class AssignmentService:
             result = await code_execution_service.execute_code(code, language, "")
             execution_time = (datetime.utcnow() - start_time).total_seconds()
             
-            # Update submission with results
-            submission.execution_status = result["status"]
-            submission.execution_output = result.get("output", "")
-            submission.execution_error = result.get("error", "")
-            submission.execution_time = execution_time
-            submission.executed_at = datetime.utcnow()
-            
             # Save results to file
-            await self._save_execution_results(submission, result)
+            results_file_path = await self._save_execution_results(submission, result, execution_time)
             
-            db.commit()
-            return result["status"]
+            return {
+                "id": submission.id,
+                "execution_status": result["status"],
+                "execution_output": result.get("output", ""),
+                "execution_error": result.get("error", ""),
+                "execution_time": execution_time,
+                "executed_at": datetime.utcnow(),
+                "results_file_path": results_file_path
+            }
             
         except Exception as e:
-            submission.execution_status = "error"
-            submission.execution_error = f"Processing failed: {str(e)}"
-            db.commit()
-            return "error"
+            return {
+                "id": submission.id,
+                "execution_status": "error",
+                "execution_error": f"Processing failed: {str(e)}"
+            }
     
     def _get_language_from_file(self, filename: str) -> str:
         """Determine language from file extension"""
@@ -298,13 +380,18 @@ class AssignmentService:
         
         return language_map.get(ext, 'python')  # Default to python
     
-    async def _save_execution_results(self, submission: StudentSubmission, result: Dict[str, Any]):
-        """Save execution results to a file in the student's folder"""
+    async def _save_execution_results(
+        self,
+        submission: StudentSubmission,
+        result: Dict[str, Any],
+        execution_time: float
+    ) -> str:
+        """Save execution results to a file in the student's folder and return its path"""
         
         results_data = {
             "student_name": submission.student_name,
-            "execution_time": submission.execution_time,
-            "execution_status": submission.execution_status,
+            "execution_time": execution_time,
+            "execution_status": result["status"],
             "output": result.get("output", ""),
             "error": result.get("error", ""),
             "timestamp": datetime.utcnow().isoformat()
@@ -315,7 +402,7 @@ class AssignmentService:
         async with aiofiles.open(results_file_path, 'w', encoding='utf-8') as f:
             await f.write(json.dumps(results_data, indent=2))
         
-        submission.results_file_path = results_file_path
+        return results_file_path
     
     async def _run_plagiarism_analysis(self, db: Session, assignment: Assignment):
         """Run plagiarism detection on all submissions"""
@@ -384,38 +471,35 @@ class AssignmentService:
         if not assignment:
             raise ValueError(f"Assignment {assignment_id} not found")
         
-        submissions = db.query(StudentSubmission).filter(
-            StudentSubmission.assignment_id == assignment_id
-        ).all()
+        # One projection query; the output/error texts never leave the database
+        submissions = StudentSubmission.report_rows(db, assignment_id)
         
-        # Execution statistics
+        # Execution and plagiarism statistics in a single pass
+        status_counts = Counter(s.execution_status for s in submissions)
         execution_stats = {
             "total": len(submissions),
-            "success": len([s for s in submissions if s.execution_status == "success"]),
-            "error": len([s for s in submissions if s.execution_status == "error"]),
-            "timeout": len([s for s in submissions if s.execution_status == "timeout"]),
-            "pending": len([s for s in submissions if s.execution_status == "pending"])
+            "success": status_counts[ExecutionStatus.SUCCESS],
+            "error": status_counts[ExecutionStatus.ERROR],
+            "timeout": status_counts[ExecutionStatus.TIMEOUT],
+            "pending": status_counts[ExecutionStatus.PENDING]
         }
         
-        # Plagiarism statistics
         plagiarism_stats = {
-            "total_flagged": len([s for s in submissions if s.is_flagged]),
+            "total_flagged": sum(1 for s in submissions if s.is_flagged),
             "analysis_completed": assignment.plagiarism_status == "completed"
         }
         
         # Student details
-        student_details = []
-        for submission in submissions:
-            student_details.append({
-                "name": submission.student_name,
-                "execution_status": submission.execution_status,
-                "execution_time": submission.execution_time,
-                "has_output": bool(submission.execution_output),
-                "has_error": bool(submission.execution_error),
-                "is_flagged": submission.is_flagged,
-                "similarity_scores": submission.similarity_scores or {},
-                "code_files": submission.code_files or []
-            })
+        student_details = [{
+            "name": submission.student_name,
+            "execution_status": submission.execution_status,
+            "execution_time": submission.execution_time,
+            "has_output": submission.has_output,
+            "has_error": submission.has_error,
+            "is_flagged": submission.is_flagged,
+            "similarity_scores": submission.similarity_scores or {},
+            "code_files": submission.code_files or []
+        } for submission in submissions]
         
         return {
             "assignment": {
@@ -1,12 +1,15 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
+from sqlalchemy import func
 from sqlalchemy.orm import Session
 from fastapi import HTTPException, status
-from app.models.user import User
+from app.models.user import User, UserToken, TokenKind
 from app.services.security import SecurityService
-from app.core.config import settings
+from app.core.config import get_settings
 import re
 
+settings = get_settings()
+
 
 class AuthService:
     @staticmethod
@@ -65,8 +68,8 @@ class AuthService:
     
     @staticmethod
     def get_user_by_email(db: Session, email: str) -> Optional[User]:
-        """Get user by email"""
-        return db.query(User).filter(User.email == email).first()
+        """Get user by email (case-insensitive, served by the lower(email) index)"""
+        return db.query(User).filter(func.lower(User.email) == email.lower()).first()
     
     @staticmethod
     def get_user_by_username(db: Session, username: str) -> Optional[User]:
@@ -131,12 +134,13 @@ class AuthService:
             username=username,
             full_name=full_name,
             hashed_password=hashed_password,
-            verification_token=verification_token,
             is_active=True,
             is_verified=False  # Require email verification
         )
         
         db.add(db_user)
+        db.flush()
+        UserToken.issue(db, db_user.id, TokenKind.EMAIL_VERIFICATION, verification_token)
         db.commit()
         db.refresh(db_user)
         
@@ -184,10 +188,9 @@ class AuthService:
             return True
         
         reset_token = SecurityService.generate_reset_token()
-        reset_expires = datetime.utcnow() + timedelta(hours=settings.password_reset_expire_hours)
+        reset_expires = datetime.now(timezone.utc) + timedelta(hours=settings.password_reset_expire_hours)
         
-        user.reset_token = reset_token
-        user.reset_token_expires = reset_expires
+        UserToken.issue(db, user.id, TokenKind.PASSWORD_RESET, reset_token, reset_expires)
         db.commit()
         
         # TODO: Send email with reset link
@@ -212,11 +215,9 @@ class AuthService:
                 detail=f"Invalid password: {', '.join(password_errors)}"
             )
         
-        # Find user with valid reset token
-        user = db.query(User).filter(
-            User.reset_token == token,
-            User.reset_token_expires > datetime.utcnow()
-        ).first()
+        # Use up a valid reset token
+        user_id = UserToken.consume(db, TokenKind.PASSWORD_RESET, token)
+        user = db.get(User, user_id) if user_id else None
         
         if not user:
             raise HTTPException(
@@ -224,10 +225,8 @@ class AuthService:
                 detail="Invalid or expired reset token"
             )
         
-        # Update password and clear reset token
+        # Update password (the reset token was deleted when consumed)
         user.hashed_password = SecurityService.hash_password(new_password)
-        user.reset_token = None
-        user.reset_token_expires = None
         db.commit()
         
         return True
@@ -235,13 +234,13 @@ class AuthService:
     @staticmethod
     def verify_email(db: Session, token: str) -> bool:
         """Verify user email using token"""
-        user = db.query(User).filter(User.verification_token == token).first()
+        user_id = UserToken.consume(db, TokenKind.EMAIL_VERIFICATION, token)
+        user = db.get(User, user_id) if user_id else None
         
         if not user:
             return False
         
         user.is_verified = True
-        user.verification_token = None
         db.commit()
         
         return True
@@ -0,0 +1,96 @@
+"""
+Response Cache - short-lived cache for expensive, staleness-tolerant responses
+
+Entries live in Redis when it is configured, so every uvicorn worker serves the
+same cached value and a clear() reaches all of them. Without Redis (or while it
+is failing) entries are kept in a per-process dict instead.
+"""
+
+import time
+from typing import Dict, Optional, Tuple
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+
+class ResponseCache:
+    """Namespaced string cache with per-entry TTL"""
+
+    def __init__(self, retry_after_seconds: int = 30):
+        self.retry_after_seconds = retry_after_seconds
+        self.client: Optional[redis.Redis] = None
+        self._disabled_until = 0.0
+        self._local: Dict[str, Tuple[float, str]] = {}
+
+    async def connect(self, redis_url: str) -> bool:
+        """Connect to Redis, returns False if it is unavailable"""
+        try:
+            client = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+            await client.ping()
+        except (RedisError, OSError) as e:
+            print(f"⚠️  Redis cache unavailable, caching in memory: {e}")
+            return False
+
+        self.client = client
+        return True
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _redis(self) -> Optional[redis.Redis]:
+        if self.client is None or time.time() < self._disabled_until:
+            return None
+        return self.client
+
+    def _redis_failed(self, e: Exception):
+        # Back off for a while instead of paying a failed round-trip per request
+        print(f"⚠️  Redis cache error, caching in memory: {e}")
+        self._disabled_until = time.time() + self.retry_after_seconds
+
+    async def get(self, namespace: str, key: str = "") -> Optional[str]:
+        cache_key = f"cache:{namespace}:{key}"
+        client = self._redis()
+        if client is not None:
+            try:
+                value = await client.get(cache_key)
+                return value.decode("utf-8") if value is not None else None
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+        entry = self._local.get(cache_key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    async def set(self, namespace: str, value: str, ttl: int, key: str = ""):
+        cache_key = f"cache:{namespace}:{key}"
+        client = self._redis()
+        if client is not None:
+            try:
+                await client.set(cache_key, value, ex=ttl)
+                return
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+        self._local[cache_key] = (time.monotonic() + ttl, value)
+
+    async def clear(self, namespace: str):
+        """Drop every entry in namespace"""
+        prefix = f"cache:{namespace}:"
+        client = self._redis()
+        if client is not None:
+            try:
+                keys = [k async for k in client.scan_iter(match=f"{prefix}*")]
+                if keys:
+                    await client.delete(*keys)
+            except (RedisError, OSError) as e:
+                self._redis_failed(e)
+
+        for cache_key in [k for k in self._local if k.startswith(prefix)]:
+            del self._local[cache_key]
+
+
+# Global instance
+response_cache = ResponseCache()
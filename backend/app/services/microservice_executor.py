@@ -7,7 +7,9 @@ import asyncio
 import aiohttp
 import time
 from typing import Dict, Any, Optional
-from app.core.config import settings
+from app.core.config import get_settings
+
+settings = get_settings()
 
 class MicroserviceExecutor:
     def __init__(self):
@@ -0,0 +1,98 @@
+"""
+Redis Rate Limiter - Sliding window rate limiting shared across workers
+
+Counters live in Redis so every uvicorn worker enforces the same limit and
+state survives restarts. The check-and-increment runs as a single Lua script
+(one round-trip, atomic). When Redis is unreachable callers get None back and
+fall back to the in-process limiter.
+"""
+
+import time
+import uuid
+from typing import Optional, Union
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+
+# KEYS[1] = counter key, ARGV = now, window, limit, unique member
+# Returns "0" if allowed, otherwise seconds until the oldest request leaves the window
+SLIDING_WINDOW_LUA = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count >= tonumber(ARGV[3]) then
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    if oldest[2] then
+        return tostring(tonumber(oldest[2]) + window - now)
+    end
+    return ARGV[2]
+end
+redis.call('ZADD', KEYS[1], ARGV[1], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return "0"
+"""
+
+
+class RedisRateLimiter:
+    """Sliding window rate limiter backed by a Redis sorted set per client"""
+
+    def __init__(self, window_seconds: int = 60, retry_after_seconds: int = 30):
+        self.window_seconds = window_seconds
+        self.retry_after_seconds = retry_after_seconds
+        self.client: Optional[redis.Redis] = None
+        self._script = None
+        self._disabled_until = 0.0
+
+    async def connect(self, redis_url: str) -> bool:
+        """Connect and register the Lua script, returns False if Redis is unavailable"""
+        try:
+            client = redis.from_url(redis_url, socket_connect_timeout=1, socket_timeout=1)
+            await client.ping()
+        except (RedisError, OSError) as e:
+            print(f"⚠️  Redis rate limiter unavailable, using in-memory limits: {e}")
+            return False
+
+        self.client = client
+        self._script = client.register_script(SLIDING_WINDOW_LUA)
+        return True
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+            self._script = None
+
+    async def hit(self, key: Union[str, bytes], limit: int, scope: str = "global") -> Optional[float]:
+        """
+        Record a request for key and check it against limit.
+        Returns 0.0 if allowed, the seconds until the client may retry if
+        the limit is exceeded, or None if Redis is not available.
+        """
+        if self._script is None:
+            return None
+
+        now = time.time()
+        if now < self._disabled_until:
+            return None
+
+        if isinstance(key, bytes):
+            key = key.hex()
+
+        try:
+            retry_after = await self._script(
+                keys=[f"rl:{scope}:{key}"],
+                args=[now, self.window_seconds, limit, f"{now}:{uuid.uuid4().hex}"]
+            )
+        except (RedisError, OSError) as e:
+            # Back off for a while instead of paying a failed round-trip per request
+            print(f"⚠️  Redis rate limiter error, falling back to in-memory limits: {e}")
+            self._disabled_until = now + self.retry_after_seconds
+            return None
+
+        return float(retry_after)
+
+
+# Global instance
+redis_rate_limiter = RedisRateLimiter()
@@ -6,7 +6,9 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from argon2 import PasswordHasher
 from argon2.exceptions import VerifyMismatchError, HashingError
-from app.core.config import settings
+from app.core.config import get_settings
+
+settings = get_settings()
 
 # Password hashing context with multiple algorithms for security
 pwd_context = CryptContext(schemes=["argon2", "bcrypt"], deprecated="auto")
@@ -4,7 +4,7 @@ Template Service - Business logic for managing code templates
 
 from typing import List, Optional, Dict
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, select
 from fastapi import HTTPException, status
 from app.models.template import Template
 from app.models.user import User
@@ -174,7 +174,9 @@ class TemplateService:
     def get_template_stats(db: Session) -> Dict:
         """Get template statistics for admin dashboard"""
         try:
-            total_templates = db.query(Template).filter(Template.is_active == True).count()
+            total_templates = db.scalar(
+                select(func.count()).select_from(Template).where(Template.is_active == True)
+            )
             
             # Templates by language
             language_stats = db.query(
@@ -187,10 +189,10 @@ class TemplateService:
             # Recent templates (last 7 days)
             from datetime import datetime, timedelta
             recent_date = datetime.utcnow() - timedelta(days=7)
-            recent_templates = db.query(Template).filter(
+            recent_templates = db.scalar(select(func.count()).select_from(Template).where(
                 Template.created_at >= recent_date,
                 Template.is_active == True
-            ).count()
+            ))
             
             return {
                 "total_templates": total_templates,